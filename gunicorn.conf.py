@@ -0,0 +1,52 @@
+"""
+Configuration gunicorn de l'interface web (mode production)
+Lancement: gunicorn -c /app/gunicorn.conf.py web_interface:app
+
+Plusieurs processus workers, chacun avec un pool de threads (gthread):
+un flux SSE ou une requête lente n'occupe qu'un thread, le dashboard reste réactif
+L'état partagé entre workers passe par les fichiers de /app/data:
+- sessions: cookies signés avec FLASK_SECRET_KEY (identique dans tous les workers)
+- comptes: users.json relu quand il change, écritures sous verrou
+- runs manuels: file SQLite jobs.db (un seul job à la fois) + verrou run.lock
+- quotas, métriques, historique des runs: SQLite
+"""
+
+import os
+
+bind = f"0.0.0.0:{os.environ.get('WEB_PORT', '5000')}"
+worker_class = "gthread"
+workers = int(os.environ.get("WEB_WORKERS", "2"))
+# Chaque flux en direct (logs, sortie d'un job) garde un thread: toujours quelques threads libres en plus
+threads = max(
+    int(os.environ.get("WEB_THREADS", "8")),
+    int(os.environ.get("MAX_LOG_SUBSCRIBERS", "5")) + 2
+)
+
+# Worker sans signe de vie depuis timeout secondes: tué et remplacé
+timeout = int(os.environ.get("WEB_TIMEOUT", "60"))
+# Arrêt (SIGTERM): les requêtes en cours ont graceful_timeout secondes pour finir
+graceful_timeout = int(os.environ.get("WEB_GRACEFUL_TIMEOUT", "20"))
+keepalive = 5
+
+# L'application est importée dans chaque worker (connexions SQLite ouvertes après le fork)
+preload_app = False
+# Pas de recyclage des workers: un worker peut surveiller un run manuel en cours
+max_requests = 0
+
+# Logs applicatifs dans netflix_bot.log, erreurs gunicorn sur la sortie standard
+errorlog = "-"
+accesslog = None
+loglevel = "info"
+proc_name = "netflix-web"
+
+
+def post_worker_init(worker):
+    """Chaque worker prend part à l'exécution des runs manuels en file"""
+    import web_interface
+    web_interface.get_job_runner()
+
+
+def worker_exit(server, worker):
+    """Écrit les dernières connexions en attente avant la fin du worker"""
+    import web_interface
+    web_interface.users_repo.flush()
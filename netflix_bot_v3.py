@@ -7,42 +7,145 @@ Utilise l'API officielle mdblist.com avec tous les endpoints
 
 import os
 import json
+import signal
+import argparse
 import logging
+import random
+import threading
+import time
 import requests
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 from pathlib import Path
 
+from netflix_http import CircuitBreakerBoard, CircuitOpenError, HttpClient, parse_timeouts
+from netflix_logs import SharedRotatingFileHandler, rotate_copytruncate
+from netflix_metrics import Metrics
+from netflix_storage import (
+    MetadataCache, Outbox, QuotaExhaustedError, QuotaTracker, RunLog, file_lock, load_bloom_filter, open_sent_store,
+    read_env_file, read_json, state_lock, update_json
+)
+
 # Configuration du logging
 LOG_DIR = Path("/app/logs")
+CRON_LOG_FILE = LOG_DIR / "cron.log"
 LOG_DIR.mkdir(parents=True, exist_ok=True)
+# Fichier partagé avec l'interface web: rotation sous verrou inter-processus
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
     handlers=[
-        logging.FileHandler(LOG_DIR / 'netflix_bot.log'),
+        SharedRotatingFileHandler(LOG_DIR / 'netflix_bot.log'),
         logging.StreamHandler()
     ]
 )
 logger = logging.getLogger(__name__)
 
 # Configuration
-MEMORY_FILE = Path("/app/data/sent_ids.json")
 DATA_DIR = Path("/app/data")
 DATA_DIR.mkdir(parents=True, exist_ok=True)
+CACHE_FILE = DATA_DIR / "metadata_cache.db"
+BLOOM_FILE = DATA_DIR / "sent_ids.bloom"
+OUTBOX_FILE = DATA_DIR / "outbox.db"
+QUOTA_FILE = DATA_DIR / "quota.db"
+LIST_STATE_FILE = DATA_DIR / "list_state.json"
+BREAKER_FILE = DATA_DIR / "circuit_breakers.json"
+RUNS_FILE = DATA_DIR / "runs.db"
+METRICS_FILE = DATA_DIR / "metrics.db"
+RUN_LOCK_FILE = DATA_DIR / "run.lock"
+
+# Code de sortie quand un autre run détient le verrou (EX_TEMPFAIL)
+EXIT_RUN_LOCKED = 75
 
 # Variables d'environnement
 DISCORD_WEBHOOK = os.getenv("DISCORD_WEBHOOK")
+DISCORD_ROUTES_FILE = Path(os.getenv("DISCORD_ROUTES_FILE", "/app/data/routes.json"))
 MDBLIST_API_KEY = os.getenv("MDBLIST_API_KEY", "")
 TMDB_API_KEY = os.getenv("TMDB_API_KEY")
-COUNTRIES = os.getenv("COUNTRIES", "FR").split(",")
+COUNTRIES = [c.strip().upper() for c in os.getenv("COUNTRIES", "FR").split(",") if c.strip()]
 DAYS_BACK = int(os.getenv("DAYS_BACK", "7"))  # Jours à vérifier en arrière
+# Configuration écrite par start.sh et modifiée par le dashboard (DAYS_BACK),
+# relue à chaque run en mode daemon
+CRON_ENV_FILE = Path("/app/.env_for_cron")
+DEDUP_BACKEND = os.getenv("DEDUP_BACKEND", "sqlite")  # sqlite (défaut) ou json
+DEDUP_BLOOM = os.getenv("DEDUP_BLOOM", "false").lower() in ("1", "true", "yes")
+DEDUP_BLOOM_CAPACITY = int(os.getenv("DEDUP_BLOOM_CAPACITY", "100000"))
+
+# Mode daemon: intervalle entre deux vérifications (+ jitter aléatoire)
+POLL_INTERVAL_MINUTES = max(1, int(os.getenv("POLL_INTERVAL_MINUTES", "60")))
+POLL_JITTER_SECONDS = max(0, int(os.getenv("POLL_JITTER_SECONDS", "60")))
+
+# Enrichissement concurrent (détails mdblist + synopsis TMDB)
+ENRICH_WORKERS = max(1, int(os.getenv("ENRICH_WORKERS", "8")))
+HOST_CONCURRENCY = {
+    "api.mdblist.com": max(1, int(os.getenv("MDBLIST_MAX_CONCURRENCY", "4"))),
+    "api.themoviedb.org": max(1, int(os.getenv("TMDB_MAX_CONCURRENCY", "8"))),
+}
+
+# Envoi Discord: retries avec backoff + jitter, outbox persistante
+DISCORD_MAX_RETRIES = int(os.getenv("DISCORD_MAX_RETRIES", "5"))
+DISCORD_OUTBOX_MAX_ATTEMPTS = int(os.getenv("DISCORD_OUTBOX_MAX_ATTEMPTS", "5"))
+DISCORD_MAX_RATE_LIMITED = 20  # 429 successifs tolérés pour un même message
+
+# Limites Discord par message
+DISCORD_MAX_EMBEDS = 10
+DISCORD_MAX_EMBED_CHARS = 6000  # total titre + description + fields + footer + author
+
+# Champs mdblist réellement utilisés: template d'embed + règles de routage
+# (create_discord_embed et route_item) - le reste du payload n'est pas conservé
+EMBED_DETAIL_FIELDS = (
+    "title", "release_year", "imdb_id", "id", "tmdb_id", "mediatype",
+    "description", "poster", "ratings", "genres", "watch_providers",
+)
+ROUTING_DETAIL_FIELDS = ("country", "language")
+EMBED_MAX_RATINGS = 3
+
+# Quotas d'API: budget quotidien (0 = illimité) et débit max (requêtes/seconde)
+# mdblist gratuit: 1000 requêtes/jour
+API_LIMITS = {
+    "mdblist": {
+        "daily": int(os.getenv("MDBLIST_DAILY_BUDGET", "1000")),
+        "rate": float(os.getenv("MDBLIST_RATE_PER_SECOND", "5")),
+    },
+    "tmdb": {
+        "daily": int(os.getenv("TMDB_DAILY_BUDGET", "0")),
+        "rate": float(os.getenv("TMDB_RATE_PER_SECOND", "40")),
+    },
+}
+# Requêtes mdblist gardées en réserve quand le budget est bas
+MDBLIST_BUDGET_RESERVE = int(os.getenv("MDBLIST_BUDGET_RESERVE", "20"))
+
+# Nombre maximum d'IDs par requête batch mdblist
+MDBLIST_BATCH_SIZE = max(1, int(os.getenv("MDBLIST_BATCH_SIZE", "200")))
+
+# Timeouts HTTP par hôte: "hote=connect:read,..." (voir netflix_http.DEFAULT_TIMEOUTS)
+HTTP_TIMEOUTS = os.getenv("HTTP_TIMEOUTS", "")
+
+# Circuit breakers mdblist/TMDB: ouverture après N échecs ou appels lents consécutifs,
+# échec immédiat pendant le cooldown (repli sur le cache, même expiré)
+UPSTREAM_HOSTS = {"mdblist": "api.mdblist.com", "tmdb": "api.themoviedb.org"}
+BREAKER_SETTINGS = {
+    "failure_threshold": max(1, int(os.getenv("BREAKER_FAILURE_THRESHOLD", "3"))),
+    "slow_call_seconds": float(os.getenv("BREAKER_SLOW_CALL_SECONDS", "5")),
+    "cooldown_seconds": int(os.getenv("BREAKER_COOLDOWN_SECONDS", "300")),
+}
+
+# Cache local des métadonnées (protège le quota mdblist de 1000 requêtes/jour)
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "5000"))
+CACHE_TTLS = {
+    "mdblist": int(os.getenv("CACHE_TTL_MDBLIST_HOURS", "24")) * 3600,
+    "tmdb": int(os.getenv("CACHE_TTL_TMDB_HOURS", "168")) * 3600,
+    # Cache négatif: titres introuvables (404, absents d'une réponse batch)
+    "not_found": int(os.getenv("CACHE_TTL_NOT_FOUND_HOURS", "6")) * 3600,
+}
 
 # URLs de base
 MDBLIST_API_BASE = "https://api.mdblist.com"
 TMDB_BASE_URL = "https://api.themoviedb.org/3"
 TMDB_IMAGE_BASE = "https://image.tmdb.org/t/p/w500"
 
-# Configuration des listes mdblist
+# Configuration des listes mdblist (listes globales par défaut)
 NETFLIX_LISTS = {
     "movies": {
         "username": "thebirdod",
@@ -54,48 +157,414 @@ NETFLIX_LISTS = {
     }
 }
 
+# Listes par pays (optionnel), filtrées par COUNTRIES
+# Format: {"FR": {"movie": [{"username": ..., "listname": ...}], "show": [...]}, "*": {...}}
+# La clé "*" remplace les listes globales par défaut
+NETFLIX_LISTS_FILE = Path(os.getenv("NETFLIX_LISTS_FILE", "/app/data/lists.json"))
+
+
+def reload_runtime_settings():
+    """
+    Relit DAYS_BACK et COUNTRIES depuis CRON_ENV_FILE (mode daemon: pris en compte
+    au run suivant, sans redémarrage). Valeur absente ou invalide: réglage inchangé
+    """
+    global DAYS_BACK, COUNTRIES
+    values = read_env_file(CRON_ENV_FILE)
+    if values.get("DAYS_BACK"):
+        try:
+            DAYS_BACK = int(values["DAYS_BACK"])
+        except ValueError:
+            logger.warning(f"⚠️ DAYS_BACK invalide dans {CRON_ENV_FILE}: {values['DAYS_BACK']}")
+    if "COUNTRIES" in values:
+        COUNTRIES = [c.strip().upper() for c in values["COUNTRIES"].split(",") if c.strip()]
+
+
+def load_list_sources():
+    """
+    Construit la liste des sources à récupérer: listes globales + listes des COUNTRIES
+    Retourne des dicts {region, media_type, username, listname} (region None = global)
+    """
+    config = {}
+    if NETFLIX_LISTS_FILE.exists():
+        try:
+            with open(NETFLIX_LISTS_FILE, 'r') as f:
+                config = json.load(f)
+        except Exception as e:
+            logger.error(f"❌ Erreur lors du chargement de {NETFLIX_LISTS_FILE}: {e}")
+    
+    regions = {"*": config.get("*") or {
+        "movie": [NETFLIX_LISTS["movies"]],
+        "show": [NETFLIX_LISTS["shows"]],
+    }}
+    for country in COUNTRIES:
+        if country in config:
+            regions[country] = config[country]
+        else:
+            logger.debug(f"ℹ️ Aucune liste configurée pour {country}")
+    
+    sources = []
+    for region, media_lists in regions.items():
+        for media_type in ("movie", "show"):
+            for list_info in media_lists.get(media_type, []):
+                sources.append({
+                    "region": None if region == "*" else region,
+                    "media_type": media_type,
+                    "username": list_info["username"],
+                    "listname": list_info["listname"],
+                })
+    return sources
+
+
+def select_detail_fields(detailed):
+    """Ne garde des détails mdblist que les champs utilisés par l'embed et le routage"""
+    if not isinstance(detailed, dict):
+        return detailed
+    selected = {
+        key: detailed[key]
+        for key in EMBED_DETAIL_FIELDS + ROUTING_DETAIL_FIELDS
+        if key in detailed
+    }
+    if isinstance(selected.get("ratings"), list):
+        selected["ratings"] = selected["ratings"][:EMBED_MAX_RATINGS]
+    return selected
+
+
+def embed_length(embed):
+    """
+    Nombre de caractères d'un embed au sens de la limite Discord
+    (title, description, fields name/value, footer text, author name)
+    """
+    length = len(embed.get("title", "")) + len(embed.get("description", ""))
+    for field in embed.get("fields", []):
+        length += len(field.get("name", "")) + len(field.get("value", ""))
+    length += len(embed.get("footer", {}).get("text", ""))
+    length += len(embed.get("author", {}).get("name", ""))
+    return length
+
+
+def pack_embeds(embeds):
+    """
+    Regroupe les embeds en messages sous les deux limites Discord:
+    10 embeds et 6000 caractères par message
+    Retourne une liste de listes d'index dans embeds (ordre préservé)
+    """
+    batches = []
+    current = []
+    current_length = 0
+    for index, embed in enumerate(embeds):
+        length = embed_length(embed)
+        if current and (len(current) >= DISCORD_MAX_EMBEDS
+                        or current_length + length > DISCORD_MAX_EMBED_CHARS):
+            batches.append(current)
+            current = []
+            current_length = 0
+        current.append(index)
+        current_length += length
+    if current:
+        batches.append(current)
+    return batches
+
+
+def webhook_label(webhook):
+    """Identifiant lisible d'un webhook sans son token (pour les logs)"""
+    parts = webhook.rstrip("/").split("/")
+    if len(parts) >= 2 and parts[-3:-2] == ["webhooks"]:
+        return f"webhook {parts[-2]}"
+    return "webhook ***"
+
+
+def load_routes():
+    """
+    Charge la table de routage Discord (DISCORD_ROUTES_FILE)
+    Format: liste de règles {"webhooks": [...], "media_types": [...], "genres": [...],
+    "countries": [...], "languages": [...]} - critères combinés en ET, valeurs en OU
+    """
+    if not DISCORD_ROUTES_FILE.exists():
+        return []
+    try:
+        with open(DISCORD_ROUTES_FILE, 'r') as f:
+            routes = json.load(f)
+        if not isinstance(routes, list):
+            raise ValueError("une liste de règles est attendue")
+        routes = [r for r in routes if isinstance(r, dict) and r.get("webhooks")]
+        logger.info(f"🧭 {len(routes)} règle(s) de routage Discord chargée(s)")
+        return routes
+    except Exception as e:
+        logger.error(f"❌ Erreur lors du chargement de {DISCORD_ROUTES_FILE}: {e}")
+        return []
+
+
+class DiscordSender:
+    """
+    Envoi de webhooks Discord respectant les rate limits
+    - 429: attend exactement retry_after avant de réessayer
+    - X-RateLimit-Remaining/Reset-After: attend la fin du bucket si épuisé
+    - Erreurs transitoires (5xx, réseau): backoff exponentiel avec jitter
+    """
+    
+    def __init__(self, http, metrics, max_retries=DISCORD_MAX_RETRIES):
+        self.http = http
+        self.metrics = metrics
+        self.max_retries = max_retries
+        self.buckets = {}  # webhook -> (remaining, reset_at)
+    
+    def wait_for_bucket(self, webhook):
+        """Attend la réinitialisation du bucket s'il est épuisé"""
+        remaining, reset_at = self.buckets.get(webhook, (None, 0))
+        delay = reset_at - time.monotonic()
+        if remaining == 0 and delay > 0:
+            logger.info(f"⏳ Rate limit Discord atteint, attente de {delay:.2f}s")
+            time.sleep(delay)
+    
+    def update_bucket(self, webhook, headers):
+        """Met à jour le bucket depuis les en-têtes X-RateLimit-*"""
+        try:
+            remaining = headers.get("X-RateLimit-Remaining")
+            reset_after = headers.get("X-RateLimit-Reset-After")
+            if remaining is not None and reset_after is not None:
+                self.buckets[webhook] = (int(remaining), time.monotonic() + float(reset_after))
+        except (TypeError, ValueError):
+            pass
+    
+    def backoff(self, attempt):
+        """Backoff exponentiel avec full jitter (plafonné à 30s)"""
+        return random.uniform(0, min(30, 2 ** attempt))
+    
+    def post(self, webhook, payload):
+        """
+        Envoie un message
+        Retourne (ok, erreur, permanent) - permanent si Discord rejette le message
+        """
+        error = None
+        attempt = 0
+        rate_limited = 0
+        while attempt <= self.max_retries:
+            self.wait_for_bucket(webhook)
+            try:
+                with self.metrics.timer("netflix_upstream_request_seconds", upstream="discord"):
+                    response = self.http.post(webhook, json=payload)
+            except requests.RequestException as e:
+                error = e
+                attempt += 1
+                self.metrics.inc("netflix_upstream_errors_total", upstream="discord")
+                if attempt <= self.max_retries:
+                    self.metrics.inc("netflix_retries_total", upstream="discord")
+                    delay = self.backoff(attempt)
+                    logger.warning(f"⚠️ Erreur réseau Discord ({e}), nouvel essai dans {delay:.1f}s")
+                    time.sleep(delay)
+                continue
+            
+            self.update_bucket(webhook, response.headers)
+            
+            if response.status_code == 429:
+                # Rate limit: attendre précisément retry_after (ne compte pas comme un échec)
+                try:
+                    retry_after = float(response.json().get("retry_after"))
+                except Exception:
+                    retry_after = float(response.headers.get("Retry-After", 1))
+                rate_limited += 1
+                if rate_limited > DISCORD_MAX_RATE_LIMITED:
+                    return False, "HTTP 429 (rate limit persistant)", False
+                self.metrics.inc("netflix_retries_total", upstream="discord")
+                logger.warning(f"⏳ Discord 429, nouvel essai dans {retry_after:.2f}s")
+                time.sleep(retry_after)
+                continue
+            
+            if response.status_code >= 500:
+                error = f"HTTP {response.status_code}"
+                attempt += 1
+                self.metrics.inc("netflix_upstream_errors_total", upstream="discord")
+                if attempt <= self.max_retries:
+                    self.metrics.inc("netflix_retries_total", upstream="discord")
+                    delay = self.backoff(attempt)
+                    logger.warning(f"⚠️ Discord {error}, nouvel essai dans {delay:.1f}s")
+                    time.sleep(delay)
+                continue
+            
+            if response.status_code >= 400:
+                return False, f"HTTP {response.status_code}: {response.text[:200]}", True
+            
+            return True, None, False
+        
+        return False, error, False
+
+
+class RunRecorder(logging.Handler):
+    """
+    Mesures d'un run: durées par phase, compteurs, appels API et erreurs
+    Branché sur le logging pendant le run pour relever warnings et erreurs
+    """
+    
+    MAX_ERRORS = 20
+    
+    def __init__(self, metrics):
+        super().__init__(level=logging.WARNING)
+        self.metrics = metrics
+        self.started_at = time.time()
+        self.phases = {}
+        self.counts = {}
+        self.errors = []
+        self.warnings = 0
+    
+    def emit(self, record):
+        if record.levelno >= logging.ERROR:
+            if len(self.errors) < self.MAX_ERRORS:
+                self.errors.append(record.getMessage()[:300])
+        else:
+            self.warnings += 1
+    
+    @contextmanager
+    def phase(self, name):
+        """Chronomètre une phase du run (cumulé si la phase se répète)"""
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            elapsed = time.monotonic() - start
+            self.phases[name] = round(self.phases.get(name, 0) + elapsed, 3)
+            self.metrics.observe("netflix_run_phase_seconds", elapsed, phase=name)
+    
+    def count(self, name, value=1):
+        self.counts[name] = self.counts.get(name, 0) + value
+    
+    def to_record(self, status, api_calls):
+        finished_at = time.time()
+        return {
+            "started_at": self.started_at,
+            "finished_at": finished_at,
+            "duration": round(finished_at - self.started_at, 3),
+            "status": status,
+            "phases": self.phases,
+            "counts": self.counts,
+            "api_calls": api_calls,
+            "warnings": self.warnings,
+            "errors": self.errors,
+        }
+
 
 class NetflixNotifier:
     """Classe principale pour gérer les notifications Netflix"""
     
-    def __init__(self):
-        self.sent_ids = self.load_sent_ids()
+    def __init__(self, daemon=False):
+        self.daemon = daemon
+        # Client HTTP partagé (pool keep-alive et timeouts par hôte)
+        self.http = HttpClient(
+            timeouts=parse_timeouts(HTTP_TIMEOUTS),
+            pool_maxsize=max(ENRICH_WORKERS, *HOST_CONCURRENCY.values())
+        )
+        self.sent_store = self.load_sent_ids()
+        self.pending_sent = {}
+        self.bloom = None
+        # En mode daemon, le filtre de Bloom sert d'index anti-doublons en mémoire
+        if DEDUP_BLOOM or daemon:
+            self.bloom = load_bloom_filter(BLOOM_FILE, self.sent_store, DEDUP_BLOOM_CAPACITY)
         self.api_headers = {}
         if MDBLIST_API_KEY:
             self.api_headers = {"apikey": MDBLIST_API_KEY}
+        # Limite de requêtes simultanées par hôte
+        self.host_limits = {
+            host: threading.BoundedSemaphore(limit)
+            for host, limit in HOST_CONCURRENCY.items()
+        }
+        self.cache = MetadataCache(CACHE_FILE, ttls=CACHE_TTLS, max_entries=CACHE_MAX_ENTRIES)
+        self.quota = QuotaTracker(QUOTA_FILE, API_LIMITS)
+        self.breakers = CircuitBreakerBoard(BREAKER_FILE, UPSTREAM_HOSTS, **BREAKER_SETTINGS)
+        self.list_sources = load_list_sources()
+        self.list_state = self.load_list_state()
+        self.outbox = Outbox(OUTBOX_FILE)
+        self.runs = RunLog(RUNS_FILE)
+        self.run = None
+        self.outbox_ids = set()
+        self.metrics = Metrics(METRICS_FILE)
+        self.discord = DiscordSender(self.http, self.metrics)
+        self.routes = load_routes()
+        self.sent_lock = threading.Lock()
+        self.pending_list_state = {}
         
     def load_sent_ids(self):
-        """Charge les IDs déjà envoyés"""
-        if MEMORY_FILE.exists():
-            try:
-                with open(MEMORY_FILE, 'r') as f:
-                    data = json.load(f)
-                    logger.info(f"✅ Chargé {len(data)} IDs depuis le fichier de mémoire")
-                    return data
-            except Exception as e:
-                logger.error(f"❌ Erreur lors du chargement de {MEMORY_FILE}: {e}")
-                return {}
-        return {}
-    
-    def save_sent_ids(self):
-        """Sauvegarde les IDs envoyés"""
+        """Ouvre le store des IDs déjà envoyés (DEDUP_BACKEND)"""
+        store = open_sent_store(DEDUP_BACKEND, DATA_DIR)
+        logger.info(f"✅ {store.count()} IDs en mémoire (backend: {DEDUP_BACKEND})")
+        return store
+    
+    def refresh_bloom(self):
+        """
+        Recharge le filtre de Bloom s'il ne correspond plus au store: IDs ajoutés
+        (run manuel, cron) ou effacés (reset) par un autre processus.
+        Un filtre périmé répondrait "nouveau" à tort pour ces IDs
+        """
+        with self.sent_lock:
+            if self.bloom is not None and self.bloom.count != self.sent_store.count():
+                self.bloom = load_bloom_filter(BLOOM_FILE, self.sent_store, DEDUP_BLOOM_CAPACITY)
+    
+    def save_sent_ids(self, records):
+        """Enregistre des IDs acquittés par Discord (une seule transaction), True si réussi"""
         try:
-            with open(MEMORY_FILE, 'w') as f:
-                json.dump(self.sent_ids, f, indent=2)
-            logger.info(f"✅ Sauvegardé {len(self.sent_ids)} IDs")
+            # Filtre déjà périmé: rechargé avant l'ajout (le compte ne le détecterait plus après)
+            self.refresh_bloom()
+            with self.sent_lock:
+                self.sent_store.add_many(records)
+                if self.bloom is not None:
+                    for item_id in records:
+                        self.bloom.add(item_id)
+                    self.bloom.count = self.sent_store.count()
+                    with state_lock(BLOOM_FILE):
+                        self.bloom.save(BLOOM_FILE)
+                if self.run is not None:
+                    self.run.count("new_sent", len(records))
+            logger.info(f"✅ Sauvegardé {len(records)} IDs ({self.sent_store.count()} au total)")
+            return True
         except Exception as e:
             logger.error(f"❌ Erreur lors de la sauvegarde: {e}")
+            return False
+    
+    def load_list_state(self):
+        """Charge l'état des listes (ETag, Last-Modified, snapshot des IDs)"""
+        return read_json(LIST_STATE_FILE, {}) or {}
+    
+    def save_list_state(self):
+        """Sauvegarde l'état des listes récupérées pendant ce run"""
+        if not self.pending_list_state:
+            return
+        try:
+            # Fusion avec l'état sur disque (relu sous verrou)
+            pending = self.pending_list_state
+            self.list_state = update_json(
+                LIST_STATE_FILE, lambda state: state.update(pending), default={}
+            )
+            self.pending_list_state = {}
+        except Exception as e:
+            logger.error(f"❌ Erreur lors de la sauvegarde de l'état des listes: {e}")
+    
+    def forget_list_items(self, media_type, item_ids):
+        """
+        Retire des snapshots en attente des items non notifiés (aucun webhook):
+        le prochain diff les propose de nouveau, une fois le routage corrigé
+        """
+        list_types = {f"{s['username']}/{s['listname']}": s["media_type"] for s in self.list_sources}
+        for list_key, state in self.pending_list_state.items():
+            if list_types.get(list_key) != media_type or not item_ids & set(state["ids"]):
+                continue
+            state["ids"] = [i for i in state["ids"] if i not in item_ids]
+            # Sans ETag/Last-Modified: pas de 304 qui masquerait ces items au prochain run
+            state["etag"] = state["last_modified"] = None
     
     def is_already_sent(self, item_id):
         """Vérifie si un item a déjà été envoyé"""
-        return str(item_id) in self.sent_ids
+        if str(item_id) in self.pending_sent or str(item_id) in self.outbox_ids:
+            return True
+        # Pré-filtre: un "non" du filtre de Bloom est définitif
+        if self.bloom is not None and not self.bloom.might_contain(item_id):
+            return False
+        return self.sent_store.contains(item_id)
     
     def mark_as_sent(self, item_id, title):
-        """Marque un item comme envoyé"""
-        self.sent_ids[str(item_id)] = {
+        """Marque un item comme envoyé pendant ce run (persisté à l'acquittement)"""
+        self.pending_sent[str(item_id)] = {
             "title": title,
             "sent_at": datetime.now().isoformat()
         }
+        return self.pending_sent[str(item_id)]
     
     def get_french_overview(self, tmdb_id, media_type):
         """
@@ -104,21 +573,35 @@ class NetflixNotifier:
         if not TMDB_API_KEY or not tmdb_id:
             return None
         
+        # Déterminer le type (movie ou tv)
+        tmdb_type = "tv" if media_type == "show" else "movie"
+        cached = self.cache_get("tmdb", tmdb_type, tmdb_id)
+        if cached is not MetadataCache.MISS:
+            logger.debug(f"💾 Synopsis TMDB {tmdb_id} depuis le cache")
+            return cached
+        if self.is_known_missing("tmdb", tmdb_type, tmdb_id):
+            return None
+        
+        if not self.breakers["tmdb"].available():
+            return self.stale_overview(tmdb_type, tmdb_id)
+        
         try:
-            # Déterminer le type (movie ou tv)
-            tmdb_type = "tv" if media_type == "show" else "movie"
             url = f"{TMDB_BASE_URL}/{tmdb_type}/{tmdb_id}"
             params = {
                 "api_key": TMDB_API_KEY,
                 "language": "fr-FR"
             }
             
-            response = requests.get(url, params=params, timeout=10)
+            response = self.call_upstream("tmdb", "GET", url, params=params)
+            if response.status_code == 404:
+                self.remember_missing("tmdb", tmdb_type, tmdb_id)
+                return None
             response.raise_for_status()
             data = response.json()
             
             # Récupérer le synopsis français
-            overview = data.get("overview", "")
+            overview = data.get("overview", "") or None
+            self.cache.set("tmdb", tmdb_type, tmdb_id, overview)
             if overview:
                 logger.debug(f"✅ Synopsis français récupéré pour TMDB ID {tmdb_id}")
                 return overview
@@ -126,29 +609,107 @@ class NetflixNotifier:
             logger.debug(f"⚠️ Pas de synopsis français pour TMDB ID {tmdb_id}")
             return None
             
+        except QuotaExhaustedError:
+            logger.debug(f"⚠️ Budget TMDB épuisé, synopsis {tmdb_id} ignoré")
+            return None
         except Exception as e:
             logger.debug(f"❌ Erreur récupération synopsis français: {e}")
+            return self.stale_overview(tmdb_type, tmdb_id)
+    
+    def cache_get(self, source, media_type, media_id, allow_stale=False):
+        """Lecture du cache de métadonnées, comptée par résultat (hit, miss, stale)"""
+        cached = self.cache.get(source, media_type, media_id, allow_stale=allow_stale)
+        if cached is MetadataCache.MISS:
+            result = "miss"
+        else:
+            result = "stale" if allow_stale else "hit"
+        self.metrics.inc("netflix_cache_lookups_total", source=source, result=result)
+        return cached
+    
+    def is_known_missing(self, source, media_type, media_id):
+        """Vrai si l'upstream a répondu "introuvable" récemment (cache négatif, TTL court)"""
+        cached = self.cache_get("not_found", media_type, f"{source}:{media_id}")
+        return cached is not MetadataCache.MISS
+    
+    def remember_missing(self, source, media_type, media_id):
+        """Cache négatif: pas de nouvelle requête pour ce titre avant CACHE_TTL_NOT_FOUND_HOURS"""
+        logger.debug(f"🚫 {source} {media_type}/{media_id} introuvable, mis en cache négatif")
+        self.cache.set("not_found", media_type, f"{source}:{media_id}", True)
+    
+    def stale_overview(self, tmdb_type, tmdb_id):
+        """Synopsis en cache même expiré (TMDB indisponible), sinon None"""
+        cached = self.cache_get("tmdb", tmdb_type, tmdb_id, allow_stale=True)
+        if cached is MetadataCache.MISS:
             return None
+        logger.debug(f"🕰️ Synopsis TMDB {tmdb_id} depuis le cache expiré")
+        return cached
     
-    def get_netflix_releases(self, media_type="movie"):
+    def call_upstream(self, upstream, method, url, **kwargs):
+        """
+        Requête vers mdblist/TMDB à travers le circuit breaker puis le quota de l'upstream
+        Lève CircuitOpenError sans appel réseau si le circuit refuse l'appel (ouvert, ou appel
+        d'essai déjà en cours), QuotaExhaustedError si le budget du jour est épuisé
+        Échecs: erreurs réseau/timeouts, HTTP 429 et 5xx, réponses plus lentes que le seuil
         """
-        Récupère les nouveautés Netflix en détectant les nouveaux ajouts à la liste
+        breaker = self.breakers[upstream]
+        if not breaker.allow():
+            raise CircuitOpenError(upstream)
+        # Jeton pris après le circuit: un appel refusé ne consomme pas de budget
+        if not self.quota.acquire(upstream):
+            breaker.release()
+            raise QuotaExhaustedError(upstream)
+        
+        with self.host_limits[UPSTREAM_HOSTS[upstream]]:
+            start = time.monotonic()
+            try:
+                response = self.http.request(method, url, **kwargs)
+            except requests.RequestException as e:
+                breaker.record_failure(e)
+                self.metrics.inc("netflix_upstream_errors_total", upstream=upstream)
+                raise
+            finally:
+                elapsed = time.monotonic() - start
+                self.metrics.observe("netflix_upstream_request_seconds", elapsed, upstream=upstream)
+        
+        if response.status_code == 429 or response.status_code >= 500:
+            breaker.record_failure(f"HTTP {response.status_code}")
+            self.metrics.inc("netflix_upstream_errors_total", upstream=upstream)
+        else:
+            breaker.record_success(elapsed)
+        return response
+    
+    def fetch_list(self, source):
+        """
+        Récupère les nouveautés d'une liste en détectant les nouveaux ajouts
         (car les listes n'ont pas de dates de sortie précises, juste l'année)
         """
-        list_info = NETFLIX_LISTS.get("movies" if media_type == "movie" else "shows")
-        if not list_info:
-            logger.error(f"❌ Type de média inconnu: {media_type}")
-            return []
+        username = source["username"]
+        listname = source["listname"]
+        media_type = source["media_type"]
+        region = source["region"] or "global"
         
-        username = list_info["username"]
-        listname = list_info["listname"]
+        list_key = f"{username}/{listname}"
+        previous = self.list_state.get(list_key, {})
         
         try:
             # Utiliser l'export JSON public
             url = f"https://mdblist.com/lists/{username}/{listname}/json"
             
-            logger.info(f"🔍 Récupération de la liste Netflix ({media_type}s)...")
-            response = requests.get(url, timeout=30)
+            # Requête conditionnelle : 304 si la liste n'a pas changé
+            headers = {}
+            if previous.get("etag"):
+                headers["If-None-Match"] = previous["etag"]
+            if previous.get("last_modified"):
+                headers["If-Modified-Since"] = previous["last_modified"]
+            
+            logger.info(f"🔍 Récupération de la liste Netflix ({media_type}s, {region}): {listname}")
+            with self.metrics.timer("netflix_upstream_request_seconds", upstream="lists"):
+                response = self.http.get(url, headers=headers)
+            
+            if response.status_code == 304:
+                logger.info(f"✅ Liste {listname} inchangée depuis la dernière exécution (304)")
+                return []
+            
             response.raise_for_status()
             
             # L'export JSON retourne directement une liste
@@ -158,22 +719,68 @@ class NetflixNotifier:
                 logger.error(f"❌ Format inattendu: {type(all_items)}")
                 return []
             
-            logger.info(f"📊 Total items dans la liste: {len(all_items)}")
+            logger.info(f"📊 Total items dans la liste {listname}: {len(all_items)}")
             
             # Ces listes sont déjà filtrées pour les nouveautés
             # On prend les N premiers items (les plus récents)
             # Ajusté selon DAYS_BACK : plus de jours = plus d'items à vérifier
             max_items = min(DAYS_BACK * 10, 50)  # Max 50 items
             recent_items = all_items[:max_items]
+            recent_ids = [str(i.get("id") or i.get("tmdb_id")) for i in recent_items]
             
-            logger.info(f"✅ Examen des {len(recent_items)} items les plus récents (liste pré-filtrée)")
+            # Mémoriser le nouvel état (sauvegardé en fin de traitement)
+            self.pending_list_state[list_key] = {
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+                "ids": recent_ids
+            }
+            
+            # Diff avec le snapshot précédent : seules les nouvelles positions sont candidates
+            if "ids" in previous:
+                known_ids = set(previous["ids"])
+                recent_items = [
+                    item for item, item_id in zip(recent_items, recent_ids)
+                    if item_id not in known_ids
+                ]
+                logger.info(f"✅ {listname}: {len(recent_items)} nouveaux items depuis le dernier snapshot")
+            else:
+                logger.info(f"✅ {listname}: examen des {len(recent_items)} items les plus récents (liste pré-filtrée)")
             
             return recent_items
             
         except Exception as e:
-            logger.error(f"❌ Erreur API: {e}")
+            logger.error(f"❌ Erreur API ({listname}): {e}")
             return []
     
+    def get_netflix_releases(self, media_types=("movie", "show")):
+        """
+        Récupère en parallèle toutes les listes configurées (tous pays)
+        Les items présents dans plusieurs listes sont fusionnés en un seul candidat
+        portant l'ensemble des régions ("regions")
+        Retourne {media_type: [items]} dans l'ordre des sources
+        """
+        sources = [s for s in self.list_sources if s["media_type"] in media_types]
+        if not sources:
+            return {media_type: [] for media_type in media_types}
+        
+        # Threads bornés: le nombre de listes croît avec COUNTRIES, mdblist.com n'a pas de limite par hôte
+        with ThreadPoolExecutor(max_workers=min(len(sources), ENRICH_WORKERS)) as pool:
+            results = list(pool.map(self.fetch_list, sources))
+        
+        releases = {media_type: {} for media_type in media_types}
+        for source, items in zip(sources, results):
+            merged = releases[source["media_type"]]
+            for item in items:
+                item_id = str(item.get("id") or item.get("tmdb_id"))
+                if item_id not in merged:
+                    item.setdefault("regions", [])
+                    merged[item_id] = item
+                regions = merged[item_id]["regions"]
+                if source["region"] and source["region"] not in regions:
+                    regions.append(source["region"])
+        
+        return {media_type: list(items.values()) for media_type, items in releases.items()}
+    
     def get_media_details(self, imdb_id=None, tmdb_id=None, media_type="movie"):
         """
         Récupère les détails d'un media via l'API mdblist
@@ -185,25 +792,189 @@ class NetflixNotifier:
         if not imdb_id and not tmdb_id:
             return None
         
+        provider = "imdb" if imdb_id else "tmdb"
+        media_id = imdb_id if imdb_id else tmdb_id
+        cached = self.cache_get("mdblist", media_type, f"{provider}:{media_id}")
+        if cached is not MetadataCache.MISS:
+            logger.debug(f"💾 Détails mdblist {provider}:{media_id} depuis le cache")
+            return select_detail_fields(cached)
+        if self.is_known_missing("mdblist", media_type, f"{provider}:{media_id}"):
+            return None
+        
+        if not self.breakers["mdblist"].available():
+            return self.stale_details(provider, media_type, media_id)
+        
         try:
             # Construction de l'URL
-            provider = "imdb" if imdb_id else "tmdb"
-            media_id = imdb_id if imdb_id else tmdb_id
             url = f"{MDBLIST_API_BASE}/{provider}/{media_type}/{media_id}"
             
-            params = {
-                "apikey": MDBLIST_API_KEY,
-                "append_to_response": "keyword,review"
-            }
+            # Pas d'append_to_response: mots-clés et critiques ne sont pas affichés
+            params = {"apikey": MDBLIST_API_KEY}
             
-            response = requests.get(url, params=params, timeout=10)
+            response = self.call_upstream("mdblist", "GET", url, params=params)
+            if response.status_code == 404:
+                self.remember_missing("mdblist", media_type, f"{provider}:{media_id}")
+                return None
             response.raise_for_status()
             
-            return response.json()
+            data = select_detail_fields(response.json())
+            self.cache.set("mdblist", media_type, f"{provider}:{media_id}", data)
+            return data
             
+        except QuotaExhaustedError:
+            logger.debug(f"⚠️ Budget mdblist épuisé, détails {provider}:{media_id} ignorés")
+            return None
         except Exception as e:
             logger.debug(f"Erreur détails media: {e}")
+            return self.stale_details(provider, media_type, media_id)
+    
+    def stale_details(self, provider, media_type, media_id):
+        """
+        Détails mdblist en cache même expirés (mdblist indisponible), marqués "stale"
+        Sans cache: None (embed construit avec les seules données de la liste)
+        """
+        cached = self.cache_get("mdblist", media_type, f"{provider}:{media_id}", allow_stale=True)
+        if not cached or cached is MetadataCache.MISS:
+            return None
+        logger.debug(f"🕰️ Détails mdblist {provider}:{media_id} depuis le cache expiré")
+        return dict(select_detail_fields(cached), stale=True)
+    
+    def get_media_details_batch(self, provider, media_type, media_ids):
+        """
+        Récupère les détails de plusieurs medias en une requête (POST /{provider}/{media_type})
+        Retourne {media_id: détails}, ou None si l'appel batch a échoué
+        Lève CircuitOpenError si le circuit refuse l'appel (ouvert ou appel d'essai en cours)
+        """
+        if not self.breakers["mdblist"].available():
+            raise CircuitOpenError("mdblist")
+        
+        try:
+            url = f"{MDBLIST_API_BASE}/{provider}/{media_type}"
+            params = {"apikey": MDBLIST_API_KEY}
+            body = {"ids": list(media_ids)}
+            
+            response = self.call_upstream("mdblist", "POST", url, params=params, json=body)
+            response.raise_for_status()
+            
+            data = response.json()
+            if not isinstance(data, list):
+                raise ValueError(f"format inattendu: {type(data)}")
+        except QuotaExhaustedError:
+            logger.warning(f"⚠️ Budget mdblist épuisé, {len(media_ids)} détails ignorés")
+            return {}
+        except CircuitOpenError:
+            raise
+        except Exception as e:
+            logger.debug(f"Erreur détails media (batch): {e}")
             return None
+        
+        results = {}
+        for detailed in data:
+            media_id = (detailed.get("ids") or {}).get(provider)
+            if media_id is None:
+                continue
+            detailed = select_detail_fields(detailed)
+            results[str(media_id)] = detailed
+            self.cache.set("mdblist", media_type, f"{provider}:{media_id}", detailed)
+        for media_id in media_ids:
+            if media_id not in results:
+                self.remember_missing("mdblist", media_type, f"{provider}:{media_id}")
+        return results
+    
+    @staticmethod
+    def details_key(item_id, media_type, item):
+        """Clé de lookup mdblist d'un candidat: (provider, media_type, media_id)"""
+        imdb_id = item.get("imdb_id")
+        if imdb_id:
+            return ("imdb", media_type, str(imdb_id))
+        return ("tmdb", media_type, str(item_id))
+    
+    def fetch_media_details(self, candidates, pool, max_calls=None):
+        """
+        Récupère les détails mdblist de tous les candidats:
+        IDs dédupliqués, cache d'abord, puis requêtes batch (repli unitaire si indisponible)
+        max_calls: nombre max de requêtes (budget bas), les titres les plus récents d'abord
+        Retourne {details_key: détails}
+        """
+        details = {}
+        missing = {}
+        seen = set()
+        # Position de chaque titre dans la liste de son type (0 = le plus récent)
+        positions = {}
+        ranks = {}
+        for item_id, media_type, item in candidates:
+            position = positions[media_type] = positions.get(media_type, -1) + 1
+            key = self.details_key(item_id, media_type, item)
+            if key in seen:
+                continue
+            seen.add(key)
+            cached = self.cache_get("mdblist", media_type, f"{key[0]}:{key[2]}")
+            if cached is not MetadataCache.MISS:
+                details[key] = select_detail_fields(cached)
+            elif self.is_known_missing("mdblist", media_type, f"{key[0]}:{key[2]}"):
+                details[key] = None
+            else:
+                missing.setdefault(key[:2], []).append(key[2])
+                ranks[key] = position
+        
+        chunks = [
+            (provider, media_type, media_ids[i:i + MDBLIST_BATCH_SIZE])
+            for (provider, media_type), media_ids in missing.items()
+            for i in range(0, len(media_ids), MDBLIST_BATCH_SIZE)
+        ]
+        # Lots classés par position dans les listes, films et séries confondus:
+        # la coupe du budget bas garde les titres en tête de chaque liste
+        chunks.sort(key=lambda chunk: ranks[(chunk[0], chunk[1], chunk[2][0])])
+        logger.info(
+            f"📦 mdblist: {len(details) + sum(len(ids) for ids in missing.values())} IDs uniques, "
+            f"{len(details)} en cache, {len(chunks)} requête(s) batch"
+        )
+        if max_calls is not None and len(chunks) > max_calls:
+            skipped = sum(len(chunk[2]) for chunk in chunks[max_calls:])
+            logger.warning(f"⚠️ Budget mdblist bas: {skipped} titres non enrichis (les plus récents d'abord)")
+            chunks = chunks[:max_calls]
+        
+        def fetch_chunk(chunk):
+            try:
+                return self.get_media_details_batch(*chunk)
+            except CircuitOpenError as e:
+                return e
+        
+        fallback = []
+        refused = []
+        for (provider, media_type, media_ids), found in zip(chunks, pool.map(fetch_chunk, chunks)):
+            keys = [(provider, media_type, media_id) for media_id in media_ids]
+            if isinstance(found, CircuitOpenError):
+                refused.extend(keys)
+            elif found is None:
+                fallback.extend(keys)
+            else:
+                for key in keys:
+                    details[key] = found.get(key[2])
+        
+        # Repli: une requête par media si l'endpoint batch n'a pas répondu
+        # Budget bas, lot refusé par le circuit (ouvert, ou appel d'essai en cours)
+        # ou circuit ouvert entre-temps: cache expiré uniquement
+        if fallback and (refused or max_calls is not None or not self.breakers["mdblist"].available()):
+            refused.extend(fallback)
+            fallback = []
+        if refused:
+            logger.warning(f"⚠️ mdblist indisponible ou budget bas: {len(refused)} titres depuis le cache expiré")
+            for key in refused:
+                details[key] = self.stale_details(*key)
+        if fallback:
+            logger.warning(f"⚠️ Batch mdblist indisponible, {len(fallback)} requêtes unitaires")
+            
+            def fetch_one(key):
+                provider, media_type, media_id = key
+                if provider == "imdb":
+                    return self.get_media_details(imdb_id=media_id, media_type=media_type)
+                return self.get_media_details(tmdb_id=media_id, media_type=media_type)
+            
+            for key, detailed in zip(fallback, pool.map(fetch_one, fallback)):
+                details[key] = detailed
+        
+        return details
     
     def create_discord_embed(self, item):
         """
@@ -232,8 +1003,10 @@ class NetflixNotifier:
         # Description - Essayer d'abord en français via TMDB
         description = None
         
-        # 1. Essayer de récupérer le synopsis français via TMDB
-        if TMDB_API_KEY and tmdb_id:
+        # 1. Synopsis français via TMDB (déjà récupéré par enrich_items si présent)
+        if "overview_fr" in item:
+            description = item["overview_fr"]
+        elif TMDB_API_KEY and tmdb_id:
             description = self.get_french_overview(tmdb_id, media_type)
         
         # 2. Sinon utiliser la description mdblist (souvent en anglais)
@@ -306,6 +1079,15 @@ class NetflixNotifier:
                     "inline": False
                 })
         
+        # Régions (listes par pays)
+        regions = item.get("regions", [])
+        if regions:
+            fields.append({
+                "name": "🌍 Régions",
+                "value": ", ".join(regions),
+                "inline": True
+            })
+        
         if fields:
             embed["fields"] = fields
         
@@ -328,133 +1110,400 @@ class NetflixNotifier:
                 "inline": False
             })
         
+        # Détails repris du cache expiré (mdblist indisponible): notes possiblement datées
+        if item.get("stale"):
+            embed["footer"] = {"text": "⚠️ Données en cache (mdblist indisponible)"}
+        
         return embed
     
-    def send_to_discord(self, embeds):
+    def route_item(self, media_type, item):
         """
-        Envoie les embeds à Discord
-        Limite: max 10 embeds par webhook
+        Détermine les webhooks destinataires d'un item selon la table de routage
+        Sans règle correspondante: DISCORD_WEBHOOK
         """
-        if not DISCORD_WEBHOOK:
-            logger.error("❌ DISCORD_WEBHOOK non configuré!")
-            return False
+        genres = {
+            (g.get("name", "") if isinstance(g, dict) else str(g)).lower()
+            for g in item.get("genres", []) or []
+        }
+        countries = {str(c).lower() for c in [item.get("country")] + item.get("regions", []) if c}
+        languages = {str(l).lower() for l in [item.get("language")] if l}
+        
+        webhooks = []
+        for route in self.routes:
+            criteria = [
+                ("media_types", {media_type}),
+                ("genres", genres),
+                ("countries", countries),
+                ("languages", languages),
+            ]
+            if all(
+                not route.get(key) or values & {str(v).lower() for v in route[key]}
+                for key, values in criteria
+            ):
+                webhooks.extend(w for w in route["webhooks"] if w not in webhooks)
+        
+        if not webhooks and DISCORD_WEBHOOK:
+            webhooks = [DISCORD_WEBHOOK]
+        return webhooks
+    
+    def queue_notifications(self, embeds, records, destinations):
+        """
+        Regroupe les embeds par webhook puis en messages, et les place dans l'outbox
+        records: liste de (item_id, infos) alignée sur embeds
+        destinations: liste des webhooks de chaque embed (alignée sur embeds)
+        Limites: max 10 embeds et 6000 caractères par message
+        """
+        per_webhook = {}
+        for index, webhooks in enumerate(destinations):
+            for webhook in webhooks:
+                per_webhook.setdefault(webhook, []).append(index)
         
-        if not embeds:
-            logger.info("ℹ️ Aucun embed à envoyer")
+        for webhook, indexes in per_webhook.items():
+            webhook_embeds = [embeds[i] for i in indexes]
+            batches = pack_embeds(webhook_embeds)
+            logger.info(f"📦 {webhook_label(webhook)}: {len(webhook_embeds)} embeds en {len(batches)} message(s)")
+            for batch in batches:
+                payload = {
+                    "username": "Netflix Notifier 🎬",
+                    "avatar_url": "https://cdn.icon-icons.com/icons2/2699/PNG/512/netflix_official_logo_icon_168085.png",
+                    "embeds": [webhook_embeds[i] for i in batch]
+                }
+                self.outbox.enqueue(webhook, payload, dict(records[indexes[i]] for i in batch))
+    
+    def send_to_discord(self):
+        """
+        Vide l'outbox vers Discord, en parallèle par webhook
+        (chaque webhook garde l'ordre de ses messages et son propre bucket de rate limit)
+        Les IDs d'un message ne sont marqués envoyés qu'après acquittement
+        Retourne True si tous les messages ont été livrés
+        """
+        messages = self.outbox.pending()
+        if not messages:
             return True
         
-        # Discord limite à 10 embeds par message
-        for i in range(0, len(embeds), 10):
-            batch = embeds[i:i+10]
+        per_webhook = {}
+        for message in messages:
+            per_webhook.setdefault(message["webhook"], []).append(message)
+        
+        with ThreadPoolExecutor(max_workers=len(per_webhook)) as pool:
+            delivered = sum(pool.map(self.deliver_messages, per_webhook.values()))
+        
+        remaining = len(messages) - delivered
+        if remaining:
+            logger.warning(f"⚠️ {remaining} message(s) en attente dans l'outbox (prochain run)")
+        return remaining == 0
+    
+    def finish_delivered(self):
+        """Enregistre les IDs des messages livrés mais pas encore acquittés (run interrompu)"""
+        for message in self.outbox.delivered():
+            logger.info(f"📬 Message {message['id']} déjà livré, enregistrement de ses IDs")
+            if self.save_sent_ids(message["items"]):
+                self.outbox.ack(message["id"])
+    
+    def deliver_messages(self, messages):
+        """Envoie dans l'ordre les messages d'un même webhook, retourne le nombre livrés"""
+        delivered = 0
+        for message in messages:
+            label = webhook_label(message["webhook"])
+            ok, error, permanent = self.discord.post(message["webhook"], message["payload"])
+            if ok:
+                # Livré d'abord (outbox), puis IDs enregistrés (store): un crash entre
+                # les deux ne provoque jamais de renvoi, finish_delivered termine au run suivant
+                self.outbox.mark_delivered(message["id"])
+                if self.save_sent_ids(message["items"]):
+                    self.outbox.ack(message["id"])
+                delivered += 1
+                logger.info(f"✅ Envoyé {len(message['payload']['embeds'])} notifications à Discord ({label})")
+                continue
             
-            payload = {
-                "username": "Netflix Notifier 🎬",
-                "avatar_url": "https://cdn.icon-icons.com/icons2/2699/PNG/512/netflix_official_logo_icon_168085.png",
-                "embeds": batch
-            }
+            self.outbox.record_failure(message["id"], error)
+            attempts = message["attempts"] + 1
+            if permanent and attempts >= DISCORD_OUTBOX_MAX_ATTEMPTS:
+                # Message rejeté de façon répétée: on l'abandonne
+                self.outbox.ack(message["id"])
+                logger.error(f"❌ Message abandonné après {attempts} tentatives ({label}): {error}")
+            else:
+                logger.error(f"❌ Erreur lors de l'envoi à Discord ({label}): {error} (conservé dans l'outbox)")
+        return delivered
+    
+    def select_candidates(self, items, media_type, queued_ids):
+        """
+        Filtre les items déjà envoyés (ou déjà retenus pendant ce run)
+        Retourne une liste de tuples (item_id, media_type, item) dans l'ordre de la liste
+        """
+        candidates = []
+        for item in items:
+            item_id = item.get("id") or item.get("tmdb_id")
+            if not item_id:
+                continue
             
-            try:
-                response = requests.post(DISCORD_WEBHOOK, json=payload, timeout=10)
-                response.raise_for_status()
-                logger.info(f"✅ Envoyé {len(batch)} notifications à Discord")
-            except Exception as e:
-                logger.error(f"❌ Erreur lors de l'envoi à Discord: {e}")
-                return False
+            if self.is_already_sent(item_id) or str(item_id) in queued_ids:
+                if media_type == "movie":
+                    logger.debug(f"⏭️ Film déjà envoyé: {item.get('title')}")
+                else:
+                    logger.debug(f"⏭️ Série déjà envoyée: {item.get('title')}")
+                continue
+            
+            queued_ids.add(str(item_id))
+            candidates.append((item_id, media_type, item))
+        
+        self.metrics.inc("netflix_items_seen_total", len(items), media_type=media_type)
+        self.metrics.inc("netflix_items_new_total", len(candidates), media_type=media_type)
+        return candidates
+    
+    def enrich_item(self, item_id, media_type, item, details, skip_tmdb=False):
+        """
+        Enrichit un item: détails mdblist (pré-récupérés) puis synopsis français TMDB
+        """
+        # Enrichissement optionnel avec détails complets
+        if MDBLIST_API_KEY:
+            detailed = details.get(self.details_key(item_id, media_type, item))
+            if detailed:
+                # Fusion des données
+                item.update(detailed)
+        
+        # Quota critique: pas d'appel TMDB (description mdblist)
+        # La description mdblist est en anglais quelle que soit la langue originale du titre:
+        # le synopsis fr-FR est toujours demandé (servi par le cache s'il y est déjà)
+        if skip_tmdb:
+            item["overview_fr"] = None
+            return
         
-        return True
+        # Synopsis français (après fusion, comme dans create_discord_embed)
+        tmdb_id = item.get("id") or item.get("tmdb_id")
+        if TMDB_API_KEY and tmdb_id:
+            item["overview_fr"] = self.get_french_overview(tmdb_id, item.get("mediatype", "movie"))
+    
+    def enrich_items(self, candidates):
+        """
+        Enrichit tous les candidats en parallèle
+        La concurrence par hôte est bornée par HOST_CONCURRENCY
+        """
+        if not candidates:
+            return
+        
+        workers = min(ENRICH_WORKERS, len(candidates))
+        logger.info(f"⚙️ Enrichissement de {len(candidates)} items ({workers} workers)...")
+        # Priorités selon le quota restant de chaque fournisseur:
+        # mdblist normal: tout | low: titres les plus récents d'abord | critical: aucun appel
+        # TMDB critical: pas de synopsis français (description mdblist)
+        mdblist_level = self.quota.level("mdblist")
+        max_calls = None
+        if mdblist_level != "normal":
+            remaining = self.quota.remaining("mdblist")
+            logger.warning(f"⚠️ Quota mdblist {mdblist_level}: enrichissement réduit (restant aujourd'hui: {remaining})")
+            if mdblist_level == "critical":
+                max_calls = 0
+            elif remaining is not None:
+                max_calls = max(0, remaining - MDBLIST_BUDGET_RESERVE)
+        skip_tmdb = self.quota.level("tmdb") == "critical"
+        if skip_tmdb:
+            logger.warning(f"⚠️ Quota TMDB critique: synopsis français désactivés (restant aujourd'hui: {self.quota.remaining('tmdb')})")
+        
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            with self.run.phase("mdblist"):
+                details = self.fetch_media_details(candidates, pool, max_calls) if MDBLIST_API_KEY else {}
+            # Synopsis TMDB; list() pour propager les exceptions éventuelles
+            with self.run.phase("tmdb"):
+                list(pool.map(lambda c: self.enrich_item(*c, details, skip_tmdb), candidates))
     
-    def process_new_releases(self):
+    def reload_config(self):
+        """
+        Relit la configuration et l'état modifiables à chaud
+        (DAYS_BACK/COUNTRIES, listes, routage, reset web, IDs envoyés par un autre processus)
+        """
+        reload_runtime_settings()
+        self.list_sources = load_list_sources()
+        self.refresh_bloom()
+        self.routes = load_routes()
+        self.list_state = self.load_list_state()
+        self.pending_list_state = {}
+    
+    def process_new_releases(self, wait_lock=False):
         """
         Traite les nouvelles sorties Netflix
+        Un seul run à la fois (cron, daemon, runs manuels): verrou data/run.lock
+        wait_lock: attend la fin du run en cours au lieu d'abandonner
+        Chaque run laisse un enregistrement structuré dans data/runs.db (lu par l'interface web)
+        Retourne le statut du run (ok, partial, error, skipped)
+        """
+        with file_lock(RUN_LOCK_FILE, blocking=wait_lock) as acquired:
+            if not acquired:
+                logger.warning("⏭️ Un autre run est déjà en cours, vérification ignorée")
+                return "skipped"
+            
+            # cron.log est écrit par redirection shell: rotation par copie + troncature
+            rotate_copytruncate(CRON_LOG_FILE)
+            self.run = RunRecorder(self.metrics)
+            api_before = self.api_call_counts()
+            logging.getLogger().addHandler(self.run)
+            status = "error"
+            try:
+                status = self.run_pipeline(self.run)
+            finally:
+                logging.getLogger().removeHandler(self.run)
+                self.record_run(status, api_before)
+                self.run = None
+            return status
+    
+    def api_call_counts(self):
+        """Requêtes HTTP émises par hôte depuis la création du client"""
+        return {host: s["requests"] for host, s in self.http.stats().items()}
+    
+    def record_run(self, status, api_before):
+        """Enregistre le run courant dans l'historique (sans jamais faire échouer le run)"""
+        api_calls = {
+            host: count - api_before.get(host, 0)
+            for host, count in self.api_call_counts().items()
+            if count - api_before.get(host, 0)
+        }
+        record = self.run.to_record(status, api_calls)
+        try:
+            self.runs.record(record)
+        except Exception as e:
+            logger.error(f"❌ Erreur enregistrement du run: {e}")
+        self.metrics.inc("netflix_runs_total", status=status)
+        self.metrics.observe("netflix_run_duration_seconds", record["duration"])
+        self.metrics.flush()
+    
+    def run_pipeline(self, run):
+        """
+        Étapes d'un run: outbox, listes, sélection, enrichissement, embeds, envoi
+        Retourne le statut du run: ok, ou partial si des messages restent dans l'outbox
         """
         logger.info("=" * 60)
         logger.info("🚀 Démarrage de la vérification des nouveautés Netflix")
+        
+        # État propre à chaque run (le notifier peut rester vivant en mode daemon)
+        self.pending_sent = {}
+        if self.daemon:
+            self.reload_config()
         logger.info(f"📅 Période: {DAYS_BACK} derniers jours")
         logger.info("=" * 60)
         
+        # Messages restés en attente lors d'un run précédent
+        with run.phase("outbox"):
+            self.finish_delivered()
+            if self.outbox.count():
+                logger.info(f"📬 {self.outbox.count()} message(s) en attente dans l'outbox, envoi...")
+                self.send_to_discord()
+            self.outbox_ids = self.outbox.pending_item_ids()
+        
         all_embeds = []
+        records = []
+        destinations = []
+        queued_ids = set()
         
-        # Traitement des films
-        logger.info("📽️ Traitement des films...")
-        movies = self.get_netflix_releases("movie")
+        # Récupération parallèle de toutes les listes (films, séries, pays)
+        logger.info(f"🌍 Régions: {', '.join(COUNTRIES) or 'global'} ({len(self.list_sources)} listes)")
+        with run.phase("fetch"):
+            releases = self.get_netflix_releases()
+        run.count("movies_found", len(releases["movie"]))
+        run.count("shows_found", len(releases["show"]))
         
-        for movie in movies:
-            movie_id = movie.get("id") or movie.get("tmdb_id")
-            if not movie_id:
-                continue
-            
-            if self.is_already_sent(movie_id):
-                logger.debug(f"⏭️ Film déjà envoyé: {movie.get('title')}")
-                continue
-            
-            # Enrichissement optionnel avec détails complets
-            if MDBLIST_API_KEY:
-                detailed = self.get_media_details(
-                    imdb_id=movie.get("imdb_id"),
-                    tmdb_id=movie_id,
-                    media_type="movie"
-                )
-                if detailed:
-                    # Fusion des données
-                    movie.update(detailed)
-            
-            embed = self.create_discord_embed(movie)
-            all_embeds.append(embed)
-            self.mark_as_sent(movie_id, movie.get("title", ""))
-            
-            logger.info(f"➕ Nouveau film: {movie.get('title')} ({movie.get('release_year')})")
-        
-        # Traitement des séries
-        logger.info("📺 Traitement des séries...")
-        shows = self.get_netflix_releases("show")
-        
-        for show in shows:
-            show_id = show.get("id") or show.get("tmdb_id")
-            if not show_id:
-                continue
-            
-            if self.is_already_sent(show_id):
-                logger.debug(f"⏭️ Série déjà envoyée: {show.get('title')}")
-                continue
-            
-            # Enrichissement optionnel
-            if MDBLIST_API_KEY:
-                detailed = self.get_media_details(
-                    imdb_id=show.get("imdb_id"),
-                    tmdb_id=show_id,
-                    media_type="show"
-                )
-                if detailed:
-                    show.update(detailed)
+        with run.phase("select"):
+            # Traitement des films
+            logger.info("📽️ Traitement des films...")
+            candidates = self.select_candidates(releases["movie"], "movie", queued_ids)
             
-            embed = self.create_discord_embed(show)
-            all_embeds.append(embed)
-            self.mark_as_sent(show_id, show.get("title", ""))
-            
-            logger.info(f"➕ Nouvelle série: {show.get('title')} ({show.get('release_year')})")
+            # Traitement des séries
+            logger.info("📺 Traitement des séries...")
+            candidates += self.select_candidates(releases["show"], "show", queued_ids)
+        run.count("candidates", len(candidates))
+        
+        # Enrichissement concurrent (phases mdblist puis tmdb)
+        self.enrich_items(candidates)
+        
+        # Construction des embeds dans l'ordre d'origine
+        unrouted = {"movie": set(), "show": set()}
+        with run.phase("embeds"):
+            for item_id, media_type, item in candidates:
+                webhooks = self.route_item(media_type, item)
+                if not webhooks:
+                    logger.warning(f"⚠️ Aucun webhook pour {item.get('title')}, ignoré")
+                    unrouted[media_type].add(str(item_id))
+                    continue
+                
+                embed = self.create_discord_embed(item)
+                destinations.append(webhooks)
+                all_embeds.append(embed)
+                records.append((str(item_id), self.mark_as_sent(item_id, item.get("title", ""))))
+                
+                if media_type == "movie":
+                    logger.info(f"➕ Nouveau film: {item.get('title')} ({item.get('release_year')})")
+                else:
+                    logger.info(f"➕ Nouvelle série: {item.get('title')} ({item.get('release_year')})")
+        run.count("embeds", len(all_embeds))
         
         # Envoi des notifications
-        if all_embeds:
-            logger.info(f"📤 Envoi de {len(all_embeds)} nouvelles notifications...")
-            self.send_to_discord(all_embeds)
-            self.save_sent_ids()
-            logger.info(f"✅ {len(all_embeds)} nouveautés envoyées avec succès!")
-        else:
-            logger.info("✅ Aucune nouvelle sortie à notifier")
+        delivered = True
+        with run.phase("send"):
+            if all_embeds:
+                logger.info(f"📤 Envoi de {len(all_embeds)} nouvelles notifications...")
+                self.queue_notifications(all_embeds, records, destinations)
+                delivered = self.send_to_discord()
+                if delivered:
+                    logger.info(f"✅ {len(all_embeds)} nouveautés envoyées avec succès!")
+            else:
+                logger.info("✅ Aucune nouvelle sortie à notifier")
+        run.count("outbox_pending", self.outbox.count())
+        
+        for media_type, item_ids in unrouted.items():
+            if item_ids:
+                self.forget_list_items(media_type, item_ids)
+        self.save_list_state()
+        self.http.log_stats()
         
         logger.info("=" * 60)
         logger.info("✨ Traitement terminé!")
         logger.info("=" * 60)
+        return "ok" if delivered and not self.outbox.count() else "partial"
+
+def run_daemon(notifier):
+    """
+    Boucle du mode daemon: un seul notifier (connexions, cache, index en mémoire)
+    et des vérifications toutes les POLL_INTERVAL_MINUTES (+ jitter)
+    """
+    stop = threading.Event()
+    
+    def handle_signal(signum, frame):
+        logger.info(f"🛑 Signal {signum} reçu, arrêt du daemon...")
+        stop.set()
+    
+    signal.signal(signal.SIGTERM, handle_signal)
+    signal.signal(signal.SIGINT, handle_signal)
+    
+    logger.info(f"🔁 Mode daemon: vérification toutes les {POLL_INTERVAL_MINUTES} min (jitter {POLL_JITTER_SECONDS}s)")
+    while not stop.is_set():
+        try:
+            notifier.process_new_releases()
+        except Exception as e:
+            logger.error(f"❌ Erreur pendant la vérification: {e}", exc_info=True)
+        
+        delay = POLL_INTERVAL_MINUTES * 60 + random.uniform(0, POLL_JITTER_SECONDS)
+        next_run = datetime.now() + timedelta(seconds=delay)
+        logger.info(f"⏰ Prochaine vérification à {next_run.strftime('%H:%M:%S')}")
+        stop.wait(delay)
+    
+    logger.info("👋 Daemon arrêté")
+    return 0
 
 
 def main():
     """Point d'entrée principal"""
+    parser = argparse.ArgumentParser(description="Bouba Discord Netflix Notifier")
+    parser.add_argument("--daemon", action="store_true",
+                        help="reste actif et vérifie périodiquement (POLL_INTERVAL_MINUTES)")
+    parser.add_argument("--wait-lock", action="store_true",
+                        help="attend la fin d'un run en cours au lieu de l'ignorer (runs manuels)")
+    args = parser.parse_args()
+    
     logger.info("🎬 Bouba Discord Netflix Notifier v3.0")
     logger.info("📡 API: mdblist.com (officielle)")
     
     # Vérification de la configuration
-    if not DISCORD_WEBHOOK:
-        logger.error("❌ DISCORD_WEBHOOK n'est pas configuré!")
+    if not DISCORD_WEBHOOK and not DISCORD_ROUTES_FILE.exists():
+        logger.error("❌ DISCORD_WEBHOOK n'est pas configuré (ni DISCORD_ROUTES_FILE)!")
         return 1
     
     if not MDBLIST_API_KEY:
@@ -466,9 +1515,11 @@ def main():
     
     # Exécution
     try:
-        notifier = NetflixNotifier()
-        notifier.process_new_releases()
-        return 0
+        notifier = NetflixNotifier(daemon=args.daemon)
+        if args.daemon:
+            return run_daemon(notifier)
+        status = notifier.process_new_releases(wait_lock=args.wait_lock)
+        return EXIT_RUN_LOCKED if status == "skipped" else 0
     except Exception as e:
         logger.error(f"❌ Erreur fatale: {e}", exc_info=True)
         return 1
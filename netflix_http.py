@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+Couche HTTP partagée du Netflix Notifier
+Pool de connexions keep-alive par hôte, timeouts connect/read par hôte,
+compression gzip/brotli et comptage de la réutilisation des connexions
+Circuit breakers par upstream (état persisté pour le dashboard)
+"""
+
+import json
+import logging
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from netflix_storage import atomic_write_json
+
+logger = logging.getLogger(__name__)
+
+# Brotli est optionnel: urllib3 ne décode "br" que si le module est installé
+try:
+    import brotli  # noqa: F401
+    ACCEPT_ENCODING = "gzip, deflate, br"
+except ImportError:
+    try:
+        import brotlicffi  # noqa: F401
+        ACCEPT_ENCODING = "gzip, deflate, br"
+    except ImportError:
+        ACCEPT_ENCODING = "gzip, deflate"
+
+# Timeouts (connect, read) en secondes par hôte
+DEFAULT_TIMEOUTS = {
+    "mdblist.com": (5, 30),
+    "api.mdblist.com": (5, 10),
+    "api.themoviedb.org": (5, 10),
+    "discord.com": (5, 10),
+}
+DEFAULT_TIMEOUT = (5, 15)
+
+
+def parse_timeouts(value):
+    """
+    Parse HTTP_TIMEOUTS: "hote=connect:read,hote=connect:read"
+    Exemple: "api.mdblist.com=3:8,discord.com=3:10"
+    """
+    timeouts = {}
+    for entry in (value or "").split(","):
+        if "=" not in entry:
+            continue
+        host, _, pair = entry.partition("=")
+        try:
+            connect, _, read = pair.partition(":")
+            timeouts[host.strip()] = (float(connect), float(read or connect))
+        except ValueError:
+            logger.warning(f"⚠️ Timeout HTTP invalide ignoré: {entry}")
+    return timeouts
+
+
+class HttpClient:
+    """
+    Client HTTP possédé par le notifier
+    Une session requests, un pool urllib3 par hôte (keep-alive),
+    timeouts par hôte et statistiques de réutilisation des connexions
+    """
+
+    def __init__(self, timeouts=None, pool_maxsize=10):
+        self.timeouts = dict(DEFAULT_TIMEOUTS)
+        self.timeouts.update(timeouts or {})
+        self.session = requests.Session()
+        self.session.headers["Accept-Encoding"] = ACCEPT_ENCODING
+        self.adapter = HTTPAdapter(
+            pool_connections=max(len(self.timeouts), 10),
+            pool_maxsize=pool_maxsize
+        )
+        self.session.mount("https://", self.adapter)
+        self.session.mount("http://", self.adapter)
+
+    def timeout_for(self, url):
+        host = urlsplit(url).hostname or ""
+        return self.timeouts.get(host, DEFAULT_TIMEOUT)
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", self.timeout_for(url))
+        return self.session.request(method, url, **kwargs)
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def stats(self):
+        """
+        Requêtes et connexions ouvertes par hôte depuis la création du client
+        reused = requêtes servies par une connexion déjà ouverte
+        """
+        stats = {}
+        pools = self.adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            host = stats.setdefault(pool.host, {"requests": 0, "connections": 0})
+            host["requests"] += pool.num_requests
+            host["connections"] += pool.num_connections
+        for host in stats.values():
+            host["reused"] = max(0, host["requests"] - host["connections"])
+        return stats
+
+    def log_stats(self):
+        for host, s in sorted(self.stats().items()):
+            logger.info(
+                f"🔌 {host}: {s['requests']} requêtes, {s['connections']} connexions "
+                f"({s['reused']} réutilisées)"
+            )
+
+    def close(self):
+        self.session.close()
+
+
+class CircuitOpenError(Exception):
+    """Appel refusé: le circuit de l'upstream est ouvert"""
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker d'un upstream
+    - closed: appels normaux, ouverture après failure_threshold échecs ou appels lents consécutifs
+    - open: échec immédiat pendant cooldown_seconds
+    - half_open: un seul appel d'essai, qui referme ou rouvre le circuit
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name, failure_threshold=3, slow_call_seconds=5.0,
+                 cooldown_seconds=60, on_change=None, state=None):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.cooldown_seconds = cooldown_seconds
+        self.on_change = on_change
+        self.lock = threading.Lock()
+        state = state or {}
+        self.state = state.get("state", self.CLOSED)
+        self.failures = state.get("failures", 0)
+        self.opened_at = state.get("opened_at") or 0
+        self.last_error = state.get("last_error")
+        self.probe_in_flight = False
+
+    def available(self):
+        """Vrai si le circuit n'est pas ouvert (sans réserver l'appel d'essai)"""
+        with self.lock:
+            return self.state != self.OPEN or time.time() - self.opened_at >= self.cooldown_seconds
+
+    def allow(self):
+        """Vrai si un appel peut partir maintenant"""
+        with self.lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN:
+                if time.time() - self.opened_at < self.cooldown_seconds:
+                    return False
+                self._transition(self.HALF_OPEN)
+            if self.probe_in_flight:
+                return False
+            self.probe_in_flight = True
+            return True
+
+    def release(self):
+        """Rend un appel accordé par allow() qui n'est finalement pas parti"""
+        with self.lock:
+            self.probe_in_flight = False
+
+    def record_success(self, elapsed):
+        if elapsed > self.slow_call_seconds:
+            self.record_failure(f"appel lent ({elapsed:.1f}s)")
+            return
+        with self.lock:
+            self.probe_in_flight = False
+            self.failures = 0
+            if self.state != self.CLOSED:
+                self._transition(self.CLOSED)
+
+    def record_failure(self, error):
+        with self.lock:
+            self.probe_in_flight = False
+            self.failures += 1
+            self.last_error = str(error)[:200]
+            if self.state == self.HALF_OPEN or (
+                self.state == self.CLOSED and self.failures >= self.failure_threshold
+            ):
+                self.opened_at = time.time()
+                self._transition(self.OPEN)
+
+    def _transition(self, state):
+        previous, self.state = self.state, state
+        if state == self.OPEN:
+            logger.warning(f"🔴 Circuit {self.name} ouvert ({self.failures} échecs: {self.last_error})")
+        elif state == self.CLOSED:
+            logger.info(f"🟢 Circuit {self.name} refermé")
+        else:
+            logger.info(f"🟡 Circuit {self.name} semi-ouvert (appel d'essai)")
+        if self.on_change and previous != state:
+            self.on_change()
+
+    def snapshot(self):
+        return {
+            "state": self.state,
+            "failures": self.failures,
+            "opened_at": self.opened_at or None,
+            "last_error": self.last_error,
+            "updated_at": time.time(),
+        }
+
+
+class CircuitBreakerBoard:
+    """Circuit breakers de tous les upstreams, état persisté dans un fichier JSON"""
+
+    def __init__(self, path, names, **settings):
+        self.path = str(path)
+        self.lock = threading.Lock()
+        saved = load_breaker_states(self.path)
+        self.breakers = {
+            name: CircuitBreaker(name, on_change=self.save, state=saved.get(name), **settings)
+            for name in names
+        }
+
+    def __getitem__(self, name):
+        return self.breakers[name]
+
+    def save(self):
+        with self.lock:
+            try:
+                atomic_write_json(self.path, {
+                    name: breaker.snapshot() for name, breaker in self.breakers.items()
+                })
+            except Exception as e:
+                logger.debug(f"Erreur sauvegarde circuit breakers: {e}")
+
+
+def load_breaker_states(path):
+    """État des circuits tel que persisté (utilisé aussi par l'interface web)"""
+    try:
+        with open(str(path), 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
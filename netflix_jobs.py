@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+Jobs de l'interface web (runs manuels du bot)
+File SQLite partagée entre processus web, exécution en arrière-plan un job à la fois,
+sortie écrite dans un fichier par job (consultable pendant l'exécution)
+"""
+
+import logging
+import os
+import sqlite3
+import subprocess
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+SKIPPED = "skipped"
+FINISHED = (SUCCEEDED, FAILED, SKIPPED)
+
+
+class JobQueue:
+    """
+    File des jobs dans SQLite (transactions BEGIN IMMEDIATE, sûre entre processus)
+    Single-flight: une demande alors qu'un job attend déjà est fusionnée avec lui,
+    et un job ne démarre que si aucun autre ne tourne
+    """
+
+    def __init__(self, db_path, output_dir, keep=50):
+        self.db_path = str(db_path)
+        self.output_dir = str(output_dir)
+        self.keep = keep
+        os.makedirs(self.output_dir, exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(
+            self.db_path, timeout=30, check_same_thread=False, isolation_level=None
+        )
+        with self.lock:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " kind TEXT NOT NULL,"
+                " status TEXT NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " started_at REAL,"
+                " finished_at REAL,"
+                " exit_code INTEGER,"
+                " error TEXT,"
+                " requested_by TEXT)"
+            )
+
+    def output_path(self, job_id):
+        return os.path.join(self.output_dir, f"{int(job_id)}.log")
+
+    @staticmethod
+    def to_dict(row):
+        if row is None:
+            return None
+        keys = ("id", "kind", "status", "created_at", "started_at", "finished_at",
+                "exit_code", "error", "requested_by")
+        return dict(zip(keys, row))
+
+    def _select(self, where, params=()):
+        return self.conn.execute(
+            "SELECT id, kind, status, created_at, started_at, finished_at, exit_code, error,"
+            f" requested_by FROM jobs {where}", params
+        ).fetchall()
+
+    def submit(self, kind="run", requested_by=None):
+        """Ajoute un job, ou retourne celui déjà en attente: (job, créé)"""
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                queued = self._select("WHERE kind = ? AND status = ? ORDER BY id LIMIT 1", (kind, QUEUED))
+                if queued:
+                    self.conn.execute("COMMIT")
+                    return self.to_dict(queued[0]), False
+                cursor = self.conn.execute(
+                    "INSERT INTO jobs (kind, status, created_at, requested_by) VALUES (?, ?, ?, ?)",
+                    (kind, QUEUED, time.time(), requested_by)
+                )
+                job_id = cursor.lastrowid
+                old = [row[0] for row in self.conn.execute(
+                    "SELECT id FROM jobs WHERE id <= ? AND status IN (?, ?, ?)",
+                    (job_id - self.keep, *FINISHED)
+                )]
+                self.conn.executemany("DELETE FROM jobs WHERE id = ?", [(i,) for i in old])
+                job = self.to_dict(self._select("WHERE id = ?", (job_id,))[0])
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+        for old_id in old:
+            try:
+                os.remove(self.output_path(old_id))
+            except FileNotFoundError:
+                pass
+        return job, True
+
+    def claim_next(self):
+        """Passe le plus ancien job en attente à running, si aucun autre ne tourne"""
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                if self._select("WHERE status = ? LIMIT 1", (RUNNING,)):
+                    self.conn.execute("COMMIT")
+                    return None
+                queued = self._select("WHERE status = ? ORDER BY id LIMIT 1", (QUEUED,))
+                if not queued:
+                    self.conn.execute("COMMIT")
+                    return None
+                job_id = queued[0][0]
+                self.conn.execute(
+                    "UPDATE jobs SET status = ?, started_at = ? WHERE id = ?",
+                    (RUNNING, time.time(), job_id)
+                )
+                job = self.to_dict(self._select("WHERE id = ?", (job_id,))[0])
+                self.conn.execute("COMMIT")
+                return job
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    def finish(self, job_id, status, exit_code=None, error=None):
+        with self.lock:
+            self.conn.execute(
+                "UPDATE jobs SET status = ?, finished_at = ?, exit_code = ?, error = ? WHERE id = ?",
+                (status, time.time(), exit_code, error, job_id)
+            )
+
+    def recover(self, max_runtime):
+        """Jobs running abandonnés (processus web arrêté pendant le run) marqués en échec"""
+        with self.lock:
+            self.conn.execute(
+                "UPDATE jobs SET status = ?, finished_at = ?, error = ?"
+                " WHERE status = ? AND started_at < ?",
+                (FAILED, time.time(), "interrompu", RUNNING, time.time() - max_runtime)
+            )
+
+    def get(self, job_id):
+        with self.lock:
+            rows = self._select("WHERE id = ?", (job_id,))
+        return self.to_dict(rows[0]) if rows else None
+
+    def recent(self, limit=20):
+        with self.lock:
+            rows = self._select("ORDER BY id DESC LIMIT ?", (limit,))
+        return [self.to_dict(row) for row in rows]
+
+    def read_output(self, job_id, offset=0, limit=64 * 1024, complete_lines=False):
+        """
+        Sortie du job à partir d'offset: (texte, offset suivant)
+        complete_lines: s'arrête au dernier saut de ligne (job encore en cours d'écriture)
+        """
+        try:
+            with open(self.output_path(job_id), "rb") as f:
+                f.seek(offset)
+                data = f.read(limit)
+        except FileNotFoundError:
+            return "", offset
+        # Ne pas couper une ligne (ni un caractère UTF-8): arrêt au dernier saut de ligne
+        if complete_lines or len(data) == limit:
+            if b"\n" in data:
+                data = data[:data.rindex(b"\n") + 1]
+            elif complete_lines:
+                data = b""
+        return data.decode("utf-8", errors="ignore"), offset + len(data)
+
+
+class JobRunner:
+    """
+    Thread de fond d'un processus web: prend les jobs en file et lance le bot
+    La sortie du bot va dans le fichier du job (jamais en mémoire)
+    """
+
+    def __init__(self, queue, command, timeout, skipped_exit_code=None, poll_interval=2.0):
+        self.queue = queue
+        self.command = list(command)
+        self.timeout = timeout
+        self.skipped_exit_code = skipped_exit_code
+        self.poll_interval = poll_interval
+        self.wakeup = threading.Event()
+        self.thread = None
+        self.start_lock = threading.Lock()
+
+    def start(self):
+        """Démarre le thread (une seule fois par processus)"""
+        with self.start_lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self.loop, name="job-runner", daemon=True)
+                self.thread.start()
+
+    def notify(self):
+        self.wakeup.set()
+
+    def loop(self):
+        while True:
+            try:
+                self.queue.recover(self.timeout + 60)
+                job = self.queue.claim_next()
+                if job is not None:
+                    self.execute(job)
+                    continue
+            except Exception as e:
+                logger.error(f"❌ Erreur du gestionnaire de jobs: {e}")
+            # Réveil immédiat pour les jobs de ce processus, polling pour ceux des autres
+            self.wakeup.wait(self.poll_interval)
+            self.wakeup.clear()
+
+    def execute(self, job):
+        logger.info(f"▶️ Job {job['id']} démarré ({job['kind']})")
+        try:
+            with open(self.queue.output_path(job["id"]), "ab") as output:
+                process = subprocess.Popen(
+                    self.command, stdout=output, stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL
+                )
+                try:
+                    exit_code = process.wait(timeout=self.timeout)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+                    process.wait()
+                    self.queue.finish(job["id"], FAILED, error=f"Timeout (>{self.timeout}s)")
+                    logger.error(f"❌ Job {job['id']} interrompu (timeout {self.timeout}s)")
+                    return
+        except Exception as e:
+            self.queue.finish(job["id"], FAILED, error=str(e))
+            logger.error(f"❌ Job {job['id']} en échec: {e}")
+            return
+
+        if exit_code == 0:
+            status = SUCCEEDED
+        elif exit_code == self.skipped_exit_code:
+            status = SKIPPED
+        else:
+            status = FAILED
+        self.queue.finish(job["id"], status, exit_code=exit_code)
+        logger.info(f"⏹️ Job {job['id']} terminé: {status} (code {exit_code})")
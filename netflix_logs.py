@@ -0,0 +1,384 @@
+#!/usr/bin/env python3
+"""
+Fichiers de logs du Netflix Notifier
+Lecture à rebours par blocs depuis la fin du fichier: le coût dépend
+du nombre de lignes demandées, pas de la taille du fichier
+Rotation multi-processus (taille + changement de jour), archives gzip et rétention
+Lecture en flux d'une plage horaire à travers les archives
+Suivi en direct d'un log (offset polling) pour le streaming SSE
+"""
+
+import fcntl
+import glob
+import gzip
+import logging
+import os
+import shutil
+import time
+from datetime import datetime
+
+from netflix_storage import file_lock
+
+BLOCK_SIZE = 64 * 1024
+
+# Rotation des logs (bot et interface web écrivent dans le même fichier)
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_MB", "10")) * 1024 * 1024
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "30"))
+LOG_RETENTION_DAYS = int(os.getenv("LOG_RETENTION_DAYS", "14"))
+
+# Intervalle entre deux vérifications de rotation (taille, jour, rotation par un autre processus)
+ROLLOVER_CHECK_SECONDS = 1.0
+
+# Suffixe des segments archivés: netflix_bot.log.20261018-080000.gz (heure de rotation)
+ARCHIVE_STAMP = "%Y%m%d-%H%M%S"
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def iter_lines_reversed(path, block_size=BLOCK_SIZE, end=None):
+    """
+    Lignes du fichier de la dernière à la première (sans fin de ligne)
+    end: lecture à partir de cet offset au lieu de la fin du fichier
+    Le découpage se fait sur les octets "\\n", qui n'apparaissent jamais dans une
+    séquence UTF-8 multi-octets: chaque ligne est décodée entière, même à cheval sur deux blocs
+    """
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        position = file_size = f.tell() if end is None else min(end, f.tell())
+        remainder = b""
+        at_end = True
+        while position > 0:
+            size = min(block_size, position)
+            position -= size
+            f.seek(position)
+            chunk = f.read(size) + remainder
+            lines = chunk.split(b"\n")
+            # Le premier morceau peut être une ligne coupée: complété par le bloc précédent
+            remainder = lines.pop(0)
+            if at_end and lines and lines[-1] == b"":
+                lines.pop()
+            at_end = False
+            for line in reversed(lines):
+                yield decode_line(line)
+        # Première ligne du fichier (vide seulement si le fichier l'est)
+        if file_size:
+            yield decode_line(remainder)
+
+
+def decode_line(line):
+    return line.rstrip(b"\r").decode("utf-8", errors="ignore")
+
+
+def tail_lines(path, count, block_size=BLOCK_SIZE, end=None):
+    """Les count dernières lignes du fichier (avant l'offset end), dans l'ordre du fichier"""
+    lines = []
+    if count <= 0:
+        return lines
+    for line in iter_lines_reversed(path, block_size, end):
+        lines.append(line)
+        if len(lines) >= count:
+            break
+    lines.reverse()
+    return lines
+
+
+def find_last_line(path, predicate, max_lines=None, block_size=BLOCK_SIZE):
+    """Dernière ligne vérifiant predicate (parmi les max_lines dernières), ou None"""
+    for index, line in enumerate(iter_lines_reversed(path, block_size)):
+        if max_lines is not None and index >= max_lines:
+            break
+        if predicate(line):
+            return line
+    return None
+
+
+def archive_path(path):
+    """Nom libre pour un segment archivé (horodaté à la rotation)"""
+    stamp = time.strftime(ARCHIVE_STAMP)
+    candidate = f"{path}.{stamp}"
+    index = 1
+    while os.path.exists(candidate) or os.path.exists(candidate + ".gz"):
+        candidate = f"{path}.{stamp}-{index}"
+        index += 1
+    return candidate
+
+
+def compress_segment(segment):
+    """Compresse un segment en .gz (fichier temporaire puis rename) et supprime l'original"""
+    target = segment + ".gz"
+    tmp_path = target + ".tmp"
+    with open(segment, "rb") as src, gzip.open(tmp_path, "wb") as dst:
+        shutil.copyfileobj(src, dst)
+    os.replace(tmp_path, target)
+    os.remove(segment)
+
+
+def list_segments(path):
+    """
+    Segments archivés d'un log, du plus ancien au plus récent: [(heure de rotation, fichier)]
+    Un segment pas encore compressé est retourné sous son nom non compressé
+    """
+    segments = {}
+    prefix = os.path.basename(path) + "."
+    for candidate in glob.glob(glob.escape(path) + ".*"):
+        name = os.path.basename(candidate)
+        if candidate.endswith((".lock", ".tmp")):
+            continue
+        stamp = name[len(prefix):]
+        if stamp.endswith(".gz"):
+            stamp = stamp[:-3]
+        try:
+            rotated_at = datetime.strptime(stamp[:15], ARCHIVE_STAMP)
+        except ValueError:
+            continue
+        # Rotations dans la même seconde: suffixe -1, -2... (ordre numérique)
+        _, _, index = stamp[15:].partition("-")
+        key = (rotated_at, int(index) if index.isdigit() else 0)
+        # Le segment non compressé est complet, le .gz peut être en cours d'écriture
+        if key not in segments or not candidate.endswith(".gz"):
+            segments[key] = (rotated_at, candidate)
+    return [segments[key] for key in sorted(segments)]
+
+
+def prune_segments(path, backup_count=LOG_BACKUP_COUNT, retention_days=LOG_RETENTION_DAYS):
+    """Supprime les archives au-delà de backup_count ou plus vieilles que retention_days"""
+    segments = list_segments(path)
+    cutoff = time.time() - retention_days * 86400
+    for index, (rotated_at, segment) in enumerate(segments):
+        too_many = index < len(segments) - backup_count
+        if too_many or rotated_at.timestamp() < cutoff:
+            try:
+                os.remove(segment)
+            except FileNotFoundError:
+                pass
+
+
+def finish_rotation(segment, path):
+    """
+    Compression et rétention, hors verrou (le segment n'est plus écrit par personne)
+    Compresse aussi les segments restés non compressés (processus arrêté juste après une rotation)
+    """
+    leftover_before = time.time() - 2 * ROLLOVER_CHECK_SECONDS - 1
+    leftovers = [
+        candidate for rotated_at, candidate in list_segments(path)
+        if not candidate.endswith(".gz") and candidate != segment and rotated_at.timestamp() < leftover_before
+    ]
+    for candidate in [segment] + leftovers:
+        try:
+            compress_segment(candidate)
+        except FileNotFoundError:
+            pass
+    prune_segments(path)
+
+
+class SharedRotatingFileHandler(logging.FileHandler):
+    """
+    FileHandler partagé entre processus (bot cron/daemon et interface web)
+    Écriture et rotation sous un verrou flock commun; rotation à LOG_MAX_BYTES
+    ou à la première écriture d'une nouvelle journée
+    Un processus rouvre le fichier dès qu'un autre l'a fait tourner (inode différent)
+    Le descripteur du verrou reste ouvert: une écriture ne coûte qu'un flock; la rotation
+    (taille, jour, inode) n'est vérifiée qu'une fois par ROLLOVER_CHECK_SECONDS
+    Un autre processus peut donc écrire dans le segment archivé jusqu'à sa prochaine
+    vérification: le segment n'est compressé qu'à la vérification suivante de la rotation
+    """
+
+    def __init__(self, filename, max_bytes=LOG_MAX_BYTES, encoding="utf-8"):
+        super().__init__(filename, encoding=encoding)
+        self.max_bytes = max_bytes
+        self.lock_path = self.baseFilename + ".lock"
+        self.lock_fd = None
+        self.next_check = 0.0
+        self.pending_segment = None
+        # Un verrou flock est partagé avec le processus parent après un fork: rouvert dans l'enfant
+        os.register_at_fork(after_in_child=self.close_lock)
+
+    def close_lock(self):
+        if self.lock_fd is not None:
+            os.close(self.lock_fd)
+            self.lock_fd = None
+
+    def reopen_if_rotated(self):
+        try:
+            current = os.stat(self.baseFilename)
+            opened = os.fstat(self.stream.fileno())
+            if (current.st_dev, current.st_ino) == (opened.st_dev, opened.st_ino):
+                return
+        except FileNotFoundError:
+            pass
+        self.stream.close()
+        self.stream = self._open()
+
+    def should_rollover(self):
+        stat = os.fstat(self.stream.fileno())
+        if stat.st_size == 0:
+            return False
+        if self.max_bytes and stat.st_size >= self.max_bytes:
+            return True
+        return time.localtime(stat.st_mtime)[:3] != time.localtime()[:3]
+
+    def emit(self, record):
+        segment = None
+        try:
+            if self.lock_fd is None:
+                self.lock_fd = os.open(self.lock_path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+            fcntl.flock(self.lock_fd, fcntl.LOCK_EX)
+            try:
+                if self.stream is None:
+                    self.stream = self._open()
+                now = time.monotonic()
+                if now >= self.next_check:
+                    self.next_check = now + ROLLOVER_CHECK_SECONDS
+                    # Segment de la rotation précédente: tous les processus ont changé de fichier
+                    segment, self.pending_segment = self.pending_segment, None
+                    self.reopen_if_rotated()
+                    if self.should_rollover():
+                        self.pending_segment = archive_path(self.baseFilename)
+                        self.stream.close()
+                        os.rename(self.baseFilename, self.pending_segment)
+                        self.stream = self._open()
+                logging.StreamHandler.emit(self, record)
+            finally:
+                fcntl.flock(self.lock_fd, fcntl.LOCK_UN)
+        except Exception:
+            self.handleError(record)
+        if segment:
+            finish_rotation(segment, self.baseFilename)
+
+    def close(self):
+        self.acquire()
+        try:
+            self.close_lock()
+        finally:
+            self.release()
+        super().close()
+
+
+def rotate_copytruncate(path, max_bytes=LOG_MAX_BYTES):
+    """
+    Rotation d'un log écrit par redirection shell (cron.log: ">> cron.log")
+    Copie puis troncature sur place: les écrivains en O_APPEND continuent au début du fichier
+    Les lignes écrites entre la copie et la troncature sont perdues (fenêtre très courte)
+    """
+    if not os.path.exists(path):
+        return False
+    with file_lock(path + ".lock"):
+        stat = os.stat(path)
+        same_day = time.localtime(stat.st_mtime)[:3] == time.localtime()[:3]
+        if stat.st_size == 0 or (stat.st_size < max_bytes and same_day):
+            return False
+        segment = archive_path(path)
+        shutil.copyfile(path, segment)
+        with open(path, "r+b") as f:
+            f.truncate(0)
+    finish_rotation(segment, path)
+    return True
+
+
+def line_timestamp(line):
+    """Horodatage "YYYY-MM-DD HH:MM:SS" en début de ligne, ou None (suite de traceback...)"""
+    stamp = line[:19]
+    if len(stamp) == 19 and stamp[4] == "-" and stamp[10] == " " and stamp[13] == ":":
+        return stamp
+    return None
+
+
+def normalize_bound(value):
+    """Borne de plage (ISO 8601, "T" ou espace) au format des logs, ou None"""
+    if not value:
+        return None
+    return datetime.fromisoformat(value.strip()).strftime(TIMESTAMP_FORMAT)
+
+
+def iter_log_range(path, since=None, until=None):
+    """
+    Lignes du log (archives comprises) dont l'horodatage est dans [since, until]
+    Lecture en flux, segment par segment: les archives hors plage ne sont pas ouvertes
+    Les lignes sans horodatage suivent la décision de la ligne précédente
+    """
+    since = normalize_bound(since)
+    until = normalize_bound(until)
+    segments = [(rotated_at.strftime(TIMESTAMP_FORMAT), segment)
+                for rotated_at, segment in list_segments(path)]
+    segments.append((None, path))
+
+    segment_start = None
+    for segment_end, segment in segments:
+        skip = (since and segment_end and segment_end < since) or \
+            (until and segment_start and segment_start > until)
+        segment_start = segment_end
+        if skip:
+            continue
+        opener = gzip.open if segment.endswith(".gz") else open
+        try:
+            with opener(segment, "rt", encoding="utf-8", errors="ignore") as f:
+                included = False
+                for line in f:
+                    stamp = line_timestamp(line)
+                    if stamp is not None:
+                        if until and stamp > until:
+                            return
+                        included = not since or stamp >= since
+                    if included:
+                        yield line
+        except FileNotFoundError:
+            continue
+
+
+def file_identity(path):
+    """Identifiant du fichier courant (inode): change à chaque rotation"""
+    try:
+        return os.stat(path).st_ino
+    except FileNotFoundError:
+        return None
+
+
+def follow_file(path, inode=None, offset=None, poll_interval=1.0, heartbeat=15.0):
+    """
+    Suit un log par offset polling, rotations comprises
+    Génère ("line", inode, offset, ligne) pour chaque nouvelle ligne complète (offset après la ligne),
+    ("rotated", inode, 0, None) quand le fichier a tourné et ("heartbeat", ...) sans activité
+    Reprise: inode/offset d'un événement précédent; autre inode = reprise au début du fichier courant
+    """
+    current = file_identity(path)
+    if offset is None or current is None:
+        offset = os.path.getsize(path) if current is not None else 0
+    elif inode != current:
+        offset = 0
+    inode = current
+
+    partial = b""
+    idle = 0.0
+    while True:
+        current = file_identity(path)
+        try:
+            size = os.path.getsize(path) if current is not None else 0
+        except FileNotFoundError:
+            size = 0
+        if current is not None and (current != inode or size < offset):
+            # Rotation (nouveau fichier) ou troncature (copytruncate): reprise au début
+            inode, offset, partial = current, 0, b""
+            yield ("rotated", inode, 0, None)
+
+        if current is not None and size > offset:
+            with open(path, "rb") as f:
+                f.seek(offset)
+                data = f.read(size - offset)
+            offset += len(data)
+            lines = (partial + data).split(b"\n")
+            partial = lines.pop()
+            line_end = offset - len(partial)
+            # Offsets décroissants depuis la fin: chaque ligne porte l'offset juste après elle
+            ends = []
+            for line in reversed(lines):
+                ends.append(line_end)
+                line_end -= len(line) + 1
+            for line, end in zip(lines, reversed(ends)):
+                yield ("line", inode, end, decode_line(line))
+            idle = 0.0
+            continue
+
+        time.sleep(poll_interval)
+        idle += poll_interval
+        if idle >= heartbeat:
+            idle = 0.0
+            yield ("heartbeat", inode, offset - len(partial), None)
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Métriques du Netflix Notifier (format texte Prometheus)
+Le bot mesure en mémoire pendant un run puis fusionne les valeurs dans SQLite;
+l'interface web relit ce fichier pour servir /metrics (cron, daemon et runs manuels cumulés)
+"""
+
+import logging
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Bornes des histogrammes de latence (secondes)
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+# Métriques exposées: nom -> (type, aide)
+METRICS = {
+    "netflix_run_phase_seconds": ("histogram", "Durée des phases d'un run"),
+    "netflix_run_duration_seconds": ("histogram", "Durée totale d'un run"),
+    "netflix_runs_total": ("counter", "Runs terminés par statut"),
+    "netflix_upstream_request_seconds": ("histogram", "Latence des requêtes HTTP par upstream"),
+    "netflix_upstream_errors_total": ("counter", "Requêtes en échec par upstream"),
+    "netflix_retries_total": ("counter", "Nouveaux essais de requêtes par upstream"),
+    "netflix_cache_lookups_total": ("counter", "Lectures du cache de métadonnées par résultat"),
+    "netflix_items_seen_total": ("counter", "Titres présents dans les listes Netflix"),
+    "netflix_items_new_total": ("counter", "Titres jamais notifiés (candidats à l'envoi)"),
+}
+
+
+def format_labels(labels):
+    """{"a": "x"} -> '{a="x"}' (ordre stable, valeurs échappées)"""
+    if not labels:
+        return ""
+    parts = []
+    for key in sorted(labels):
+        value = str(labels[key]).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        parts.append(f'{key}="{value}"')
+    return "{" + ",".join(parts) + "}"
+
+
+def format_value(value):
+    if value == int(value):
+        return str(int(value))
+    return repr(float(value))
+
+
+class Metrics:
+    """
+    Compteurs et histogrammes en mémoire (thread-safe)
+    flush() ajoute les valeurs au fichier SQLite partagé puis remet la mémoire à zéro
+    """
+
+    def __init__(self, db_path, buckets=DEFAULT_BUCKETS):
+        self.db_path = str(db_path)
+        self.buckets = tuple(buckets)
+        self.lock = threading.Lock()
+        self.samples = {}
+
+    def _add(self, name, labels, value):
+        key = (name, format_labels(labels))
+        self.samples[key] = self.samples.get(key, 0) + value
+
+    def inc(self, name, value=1, **labels):
+        with self.lock:
+            self._add(name, labels, value)
+
+    def observe(self, name, value, **labels):
+        """
+        Ajoute une observation à un histogramme (buckets cumulatifs, _sum, _count)
+        Tous les buckets sont écrits, à 0 sous la valeur: l'histogramme exposé est complet
+        """
+        with self.lock:
+            for bound in self.buckets:
+                self._add(f"{name}_bucket", dict(labels, le=format_value(bound)), int(value <= bound))
+            self._add(f"{name}_bucket", dict(labels, le="+Inf"), 1)
+            self._add(f"{name}_sum", labels, value)
+            self._add(f"{name}_count", labels, 1)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(name, time.monotonic() - start, **labels)
+
+    def flush(self):
+        """Fusionne les valeurs du run dans le fichier partagé (une transaction)"""
+        with self.lock:
+            samples, self.samples = self.samples, {}
+        if not samples:
+            return
+        try:
+            conn = connect(self.db_path)
+            try:
+                with conn:
+                    conn.executemany(
+                        "INSERT INTO metric_samples (name, labels, value) VALUES (?, ?, ?)"
+                        " ON CONFLICT(name, labels) DO UPDATE SET value = value + excluded.value",
+                        [(name, labels, value) for (name, labels), value in samples.items()]
+                    )
+            finally:
+                conn.close()
+        except Exception as e:
+            logger.error(f"❌ Erreur sauvegarde des métriques: {e}")
+
+
+def connect(db_path):
+    conn = sqlite3.connect(str(db_path), timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS metric_samples ("
+        " name TEXT NOT NULL,"
+        " labels TEXT NOT NULL,"
+        " value REAL NOT NULL,"
+        " PRIMARY KEY (name, labels))"
+    )
+    return conn
+
+
+LE_LABEL = re.compile(r'le="([^"]*)"')
+
+
+def sample_order(sample):
+    """Tri d'une famille: par série de labels, puis buckets par borne croissante, _sum, _count"""
+    name, labels, _ = sample
+    match = LE_LABEL.search(labels)
+    bound = float("inf") if not match else float(match.group(1).replace("+Inf", "inf"))
+    series = LE_LABEL.sub("", labels).replace(",}", "}").replace("{,", "{").replace("{}", "")
+    suffix = 0 if name.endswith("_bucket") else 1 if name.endswith("_sum") else 2
+    return (series, suffix, bound)
+
+
+def base_name(sample_name):
+    for suffix in ("_bucket", "_sum", "_count"):
+        if sample_name.endswith(suffix) and sample_name[:-len(suffix)] in METRICS:
+            return sample_name[:-len(suffix)]
+    return sample_name
+
+
+def missing_buckets(samples, buckets):
+    """
+    Buckets absents d'un histogramme (données écrites avant que observe() n'enregistre
+    tous les buckets), au cumul du bucket présent juste en dessous, sinon 0
+    """
+    series = {}
+    for name, labels, value in samples:
+        match = LE_LABEL.search(labels) if name.endswith("_bucket") else None
+        if match:
+            entry = series.setdefault((name, LE_LABEL.sub("", labels)), (labels, {}))
+            entry[1][float(match.group(1).replace("+Inf", "inf"))] = value
+    missing = []
+    for (name, _), (labels, counts) in series.items():
+        for bound in buckets:
+            if float(bound) not in counts:
+                below = [count for le, count in counts.items() if le < bound]
+                missing.append((name, LE_LABEL.sub(f'le="{format_value(bound)}"', labels), max(below, default=0)))
+    return missing
+
+
+def render_prometheus(db_path, gauges=None, buckets=DEFAULT_BUCKETS):
+    """
+    Exposition texte Prometheus des métriques persistées
+    gauges: {nom: (aide, [(labels, valeur), ...])} calculées à la lecture (quota, circuits...)
+    Histogrammes: chaque borne de buckets est exposée pour chaque série de labels
+    """
+    conn = connect(db_path)
+    try:
+        rows = conn.execute(
+            "SELECT name, labels, value FROM metric_samples ORDER BY name, labels"
+        ).fetchall()
+    finally:
+        conn.close()
+
+    families = {}
+    for name, labels, value in rows:
+        families.setdefault(base_name(name), []).append((name, labels, value))
+
+    lines = []
+    for family in sorted(families):
+        kind, help_text = METRICS.get(family, ("untyped", ""))
+        if kind == "histogram":
+            families[family] += missing_buckets(families[family], buckets)
+        lines.append(f"# HELP {family} {help_text}")
+        lines.append(f"# TYPE {family} {kind}")
+        for name, labels, value in sorted(families[family], key=sample_order):
+            lines.append(f"{name}{labels} {format_value(value)}")
+
+    for family, (help_text, samples) in sorted((gauges or {}).items()):
+        lines.append(f"# HELP {family} {help_text}")
+        lines.append(f"# TYPE {family} gauge")
+        for labels, value in samples:
+            lines.append(f"{family}{format_labels(labels)} {format_value(value)}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,918 @@
+#!/usr/bin/env python3
+"""
+Stockage persistant du Netflix Notifier
+Cache local des métadonnées (mdblist, TMDB) basé sur SQLite
+et écritures atomiques des fichiers JSON d'état
+Store anti-doublons (IDs déjà envoyés) avec backends JSON et SQLite
+et pré-filtre probabiliste (Bloom) persisté à côté du store
+Outbox persistante des messages Discord non acquittés
+Quotas d'API (budget quotidien + token bucket) partagés entre processus
+Historique structuré des runs (durées par phase, compteurs, erreurs)
+Verrous inter-processus (flock)
+Fichiers d'état partagés (JSON, KEY=VALUE): lecture-modification-écriture sous verrou
+Comptes de l'interface web en mémoire, invalidés quand users.json change
+"""
+
+import fcntl
+import hashlib
+import json
+import logging
+import math
+import os
+import struct
+import sqlite3
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+
+@contextmanager
+def file_lock(lock_path, blocking=True):
+    """
+    Verrou exclusif inter-processus (flock) sur un fichier .lock
+    Produit True si le verrou est obtenu; en non bloquant, False s'il est déjà pris
+    Le verrou est libéré par le noyau si le processus meurt
+    """
+    with open(str(lock_path), "a") as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def atomic_write_text(path, text):
+    """
+    Écrit un fichier texte de façon atomique (fichier temporaire + rename)
+    Un crash pendant l'écriture ne peut pas corrompre le fichier existant;
+    les lecteurs voient l'ancien ou le nouveau contenu, jamais un fichier partiel
+    Les permissions d'un fichier existant sont conservées (644 sinon)
+    """
+    path = str(path)
+    directory = os.path.dirname(path) or "."
+    try:
+        mode = os.stat(path).st_mode & 0o777
+    except FileNotFoundError:
+        mode = 0o644
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=os.path.splitext(path)[1])
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp_path, mode)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+def atomic_write_json(path, data, indent=None):
+    """Écrit un fichier JSON de façon atomique (voir atomic_write_text)"""
+    atomic_write_text(path, json.dumps(data, indent=indent))
+
+
+# ============================================================================
+# FICHIERS D'ÉTAT PARTAGÉS
+# ============================================================================
+
+def state_lock(path, blocking=True):
+    """
+    Verrou d'écriture d'un fichier d'état (fichier "<path>.lock" à côté)
+    Les lecteurs n'en ont pas besoin: les écritures sont atomiques
+    """
+    return file_lock(f"{path}.lock", blocking=blocking)
+
+
+def read_json(path, default=None):
+    """Contenu d'un fichier JSON, ou default s'il est absent ou illisible"""
+    try:
+        with open(str(path), "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return default
+    except (OSError, ValueError) as e:
+        logger.error(f"❌ Erreur lors de la lecture de {path}: {e}")
+        return default
+
+
+def update_json(path, mutate, default=None, indent=None):
+    """
+    Lecture-modification-écriture d'un fichier JSON sous verrou inter-processus
+    mutate(data) modifie data sur place ou retourne le nouveau contenu
+    Deux écrivains concurrents (bot, processus web) ne s'écrasent jamais l'un l'autre
+    """
+    with state_lock(path):
+        data = read_json(path, default)
+        result = mutate(data)
+        if result is not None:
+            data = result
+        atomic_write_json(path, data, indent=indent)
+        return data
+
+
+def read_env_file(path):
+    """Variables d'un fichier KEY=VALUE ({} s'il est absent), commentaires ignorés"""
+    values = {}
+    try:
+        with open(str(path), "r") as f:
+            for line in f:
+                line = line.strip()
+                if "=" in line and not line.startswith("#"):
+                    key, value = line.split("=", 1)
+                    values[key.strip()] = value.strip()
+    except FileNotFoundError:
+        pass
+    return values
+
+
+def update_env_file(path, updates):
+    """
+    Met à jour des variables d'un fichier KEY=VALUE (.env_for_cron) sous verrou
+    Les autres lignes sont conservées telles quelles, les clés absentes ajoutées à la fin
+    """
+    with state_lock(path):
+        try:
+            with open(str(path), "r") as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            lines = []
+        remaining = dict(updates)
+        for index, line in enumerate(lines):
+            key = line.split("=", 1)[0].strip()
+            if "=" in line and key in remaining:
+                lines[index] = f"{key}={remaining.pop(key)}\n"
+        if lines and not lines[-1].endswith("\n"):
+            lines[-1] += "\n"
+        lines.extend(f"{key}={value}\n" for key, value in remaining.items())
+        atomic_write_text(path, "".join(lines))
+
+
+def file_signature(path):
+    """
+    Signature d'un fichier (inode, mtime, taille), ou None s'il est absent
+    Change à chaque réécriture atomique (nouvel inode) comme à chaque édition sur place
+    """
+    try:
+        stat = os.stat(str(path))
+    except FileNotFoundError:
+        return None
+    return (stat.st_dev, stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+
+class UsersRepository:
+    """
+    Comptes de l'interface web (users.json) gardés en mémoire
+    Relu seulement quand le fichier change (signature inode/mtime/taille):
+    une édition faite hors de l'application est vue à la requête suivante
+    Les dates de dernière connexion sont regroupées et écrites au plus toutes les
+    flush_interval secondes (et à l'arrêt), pas à chaque connexion
+    """
+
+    def __init__(self, path, flush_interval=60):
+        self.path = str(path)
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        self.users = {}
+        self.signature = None
+        self.pending_logins = {}
+        self.last_flush = time.monotonic()
+
+    def _refresh(self):
+        signature = file_signature(self.path)
+        if signature != self.signature:
+            data = read_json(self.path, {})
+            self.users = data if isinstance(data, dict) else {}
+            self.signature = signature
+
+    def _store(self, mutate):
+        """Lecture-modification-écriture sous verrou, puis mise à jour du cache"""
+        self.users = update_json(self.path, mutate, default={}, indent=2)
+        self.signature = file_signature(self.path)
+
+    def get(self, username):
+        """Copie du compte (dernière connexion en attente comprise), ou None"""
+        with self.lock:
+            self._refresh()
+            user = self.users.get(username)
+            if not isinstance(user, dict):
+                return None
+            user = dict(user)
+            if username in self.pending_logins:
+                user["last_login"] = self.pending_logins[username]
+            return user
+
+    def all(self):
+        with self.lock:
+            self._refresh()
+            return {name: dict(user) for name, user in self.users.items()}
+
+    def update(self, username, **fields):
+        """Met à jour les champs d'un compte existant (écriture immédiate)"""
+        def apply(users):
+            if username in users:
+                users[username].update(fields)
+        with self.lock:
+            self._store(apply)
+
+    def record_login(self, username, when):
+        """Note une connexion; écrite avec les autres au prochain flush"""
+        with self.lock:
+            self.pending_logins[username] = when
+            due = time.monotonic() - self.last_flush >= self.flush_interval
+        if due:
+            self.flush()
+
+    def flush(self):
+        """Écrit les dernières connexions en attente (une seule réécriture du fichier)"""
+        with self.lock:
+            self.last_flush = time.monotonic()
+            pending, self.pending_logins = self.pending_logins, {}
+            if not pending:
+                return
+
+            def apply(users):
+                for username, when in pending.items():
+                    if username in users:
+                        users[username]["last_login"] = when
+            try:
+                self._store(apply)
+            except Exception as e:
+                # Réessayé au prochain flush
+                for username, when in pending.items():
+                    self.pending_logins.setdefault(username, when)
+                logger.error(f"❌ Erreur sauvegarde des connexions: {e}")
+
+
+class MetadataCache:
+    """
+    Cache SQLite des réponses mdblist/TMDB
+    Clé: source/media_type/id, TTL par source, éviction LRU bornée en taille
+    """
+
+    MISS = object()
+
+    def __init__(self, path, ttls=None, max_entries=5000):
+        self.path = str(path)
+        self.ttls = ttls or {}
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        with self.lock, self.conn:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS metadata_cache ("
+                " key TEXT PRIMARY KEY,"
+                " source TEXT NOT NULL,"
+                " value TEXT NOT NULL,"
+                " stored_at REAL NOT NULL,"
+                " accessed_at REAL NOT NULL)"
+            )
+            self.conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_metadata_cache_accessed"
+                " ON metadata_cache (accessed_at)"
+            )
+
+    @staticmethod
+    def make_key(source, media_type, media_id):
+        return f"{source}/{media_type}/{media_id}"
+
+    def get(self, source, media_type, media_id, allow_stale=False):
+        """
+        Retourne la valeur en cache ou MetadataCache.MISS (absente ou expirée)
+        allow_stale: ignore le TTL (repli quand l'upstream est indisponible)
+        """
+        key = self.make_key(source, media_type, media_id)
+        now = time.time()
+        try:
+            with self.lock, self.conn:
+                row = self.conn.execute(
+                    "SELECT value, stored_at FROM metadata_cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row is None:
+                    return self.MISS
+
+                value, stored_at = row
+                ttl = self.ttls.get(source)
+                if not allow_stale and ttl is not None and now - stored_at > ttl:
+                    return self.MISS
+
+                self.conn.execute(
+                    "UPDATE metadata_cache SET accessed_at = ? WHERE key = ?", (now, key)
+                )
+            return json.loads(value)
+        except Exception as e:
+            logger.debug(f"Erreur lecture cache ({key}): {e}")
+            return self.MISS
+
+    def set(self, source, media_type, media_id, value):
+        """Enregistre une valeur (None accepté: résultat vide mis en cache)"""
+        key = self.make_key(source, media_type, media_id)
+        now = time.time()
+        try:
+            with self.lock, self.conn:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO metadata_cache"
+                    " (key, source, value, stored_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                    (key, source, json.dumps(value), now, now)
+                )
+                self._evict()
+        except Exception as e:
+            logger.debug(f"Erreur écriture cache ({key}): {e}")
+
+    def _evict(self):
+        """Supprime les entrées les moins récemment utilisées au-delà de max_entries"""
+        count = self.conn.execute("SELECT COUNT(*) FROM metadata_cache").fetchone()[0]
+        excess = count - self.max_entries
+        if excess > 0:
+            self.conn.execute(
+                "DELETE FROM metadata_cache WHERE key IN ("
+                " SELECT key FROM metadata_cache ORDER BY accessed_at LIMIT ?)",
+                (excess,)
+            )
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+# ============================================================================
+# ANTI-DOUBLONS (IDs déjà envoyés)
+# ============================================================================
+
+class JsonSentStore:
+    """
+    Backend historique: tout le fichier sent_ids.json en mémoire
+    Les écritures relisent le fichier sous verrou puis le remplacent atomiquement
+    (un reset depuis l'interface web n'est jamais écrasé par le bot, et inversement)
+    Relu quand un autre processus l'a réécrit (workers web, bot)
+    """
+
+    def __init__(self, json_path):
+        self.json_path = str(json_path)
+        self.lock = threading.Lock()
+        self.signature = None
+        self.data = {}
+        self.refresh()
+
+    def load(self):
+        data = read_json(self.json_path, {})
+        if isinstance(data, list):
+            data = {str(item_id): {} for item_id in data}
+        return data if isinstance(data, dict) else {}
+
+    def refresh(self):
+        signature = file_signature(self.json_path)
+        if signature != self.signature:
+            self.data = self.load()
+            self.signature = signature
+        return self.data
+
+    def contains(self, item_id):
+        return str(item_id) in self.refresh()
+
+    def add_many(self, records):
+        """records: dict {item_id: {"title": ..., "sent_at": ...}}"""
+        with self.lock, state_lock(self.json_path):
+            data = self.load()
+            data.update(records)
+            atomic_write_json(self.json_path, data, indent=2)
+            self.data, self.signature = data, file_signature(self.json_path)
+
+    def count(self):
+        return len(self.refresh())
+
+    def iter_ids(self):
+        return iter(list(self.refresh()))
+
+    def titles(self, limit=None):
+        titles = [v.get("title", "Inconnu") for v in self.refresh().values() if isinstance(v, dict)]
+        return titles[:limit] if limit is not None else titles
+
+    def clear(self):
+        with self.lock, state_lock(self.json_path):
+            atomic_write_json(self.json_path, {})
+            self.data, self.signature = {}, file_signature(self.json_path)
+
+    def close(self):
+        pass
+
+
+class SqliteSentStore:
+    """
+    Backend SQLite indexé sur l'ID
+    Appartenance et comptage en O(1), import automatique de sent_ids.json
+    """
+
+    def __init__(self, db_path, json_path=None):
+        self.db_path = str(db_path)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+        with self.lock, self.conn:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS sent_ids ("
+                " item_id TEXT PRIMARY KEY,"
+                " title TEXT,"
+                " sent_at TEXT)"
+            )
+            # Compteur maintenu par triggers pour un COUNT en O(1)
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS store_meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)"
+            )
+            self.conn.execute(
+                "INSERT OR IGNORE INTO store_meta (key, value)"
+                " SELECT 'count', COUNT(*) FROM sent_ids"
+            )
+            self.conn.execute(
+                "CREATE TRIGGER IF NOT EXISTS sent_ids_count_insert AFTER INSERT ON sent_ids"
+                " BEGIN UPDATE store_meta SET value = value + 1 WHERE key = 'count'; END"
+            )
+            self.conn.execute(
+                "CREATE TRIGGER IF NOT EXISTS sent_ids_count_delete AFTER DELETE ON sent_ids"
+                " BEGIN UPDATE store_meta SET value = value - 1 WHERE key = 'count'; END"
+            )
+        if json_path:
+            self.import_json(json_path)
+
+    def import_json(self, json_path):
+        """Importe un ancien sent_ids.json puis le renomme en .migrated"""
+        json_path = str(json_path)
+        if not os.path.exists(json_path):
+            return
+        try:
+            with open(json_path, 'r') as f:
+                data = json.load(f)
+            if isinstance(data, list):
+                data = {str(item_id): {} for item_id in data}
+            if not isinstance(data, dict):
+                data = {}
+            self.add_many(data)
+            os.replace(json_path, json_path + ".migrated")
+            logger.info(f"✅ {len(data)} IDs importés depuis {json_path}")
+        except FileNotFoundError:
+            # Déjà migré par un autre processus
+            pass
+        except Exception as e:
+            logger.error(f"❌ Erreur lors de l'import de {json_path}: {e}")
+
+    def contains(self, item_id):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT 1 FROM sent_ids WHERE item_id = ?", (str(item_id),)
+            ).fetchone()
+        return row is not None
+
+    def add_many(self, records):
+        """records: dict {item_id: {"title": ..., "sent_at": ...}} (une seule transaction)"""
+        rows = [
+            (str(item_id), (info or {}).get("title"), (info or {}).get("sent_at"))
+            for item_id, info in records.items()
+        ]
+        with self.lock, self.conn:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO sent_ids (item_id, title, sent_at) VALUES (?, ?, ?)", rows
+            )
+
+    def count(self):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT value FROM store_meta WHERE key = 'count'"
+            ).fetchone()
+        return row[0] if row else 0
+
+    def iter_ids(self):
+        """Parcourt les IDs par blocs, sans tout charger en mémoire"""
+        last_rowid = 0
+        while True:
+            with self.lock:
+                rows = self.conn.execute(
+                    "SELECT rowid, item_id FROM sent_ids WHERE rowid > ? ORDER BY rowid LIMIT 1000",
+                    (last_rowid,)
+                ).fetchall()
+            if not rows:
+                return
+            for rowid, item_id in rows:
+                yield item_id
+            last_rowid = rows[-1][0]
+
+    def titles(self, limit=None):
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT title FROM sent_ids ORDER BY rowid LIMIT ?",
+                (-1 if limit is None else limit,)
+            ).fetchall()
+        return [title or "Inconnu" for (title,) in rows]
+
+    def clear(self):
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM sent_ids")
+            self.conn.execute("UPDATE store_meta SET value = 0 WHERE key = 'count'")
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+def open_sent_store(backend, data_dir):
+    """
+    Ouvre le backend anti-doublons configuré (DEDUP_BACKEND)
+    - sqlite (défaut): data/sent_ids.db, importe data/sent_ids.json au besoin
+    - json: data/sent_ids.json (format historique)
+    """
+    json_path = os.path.join(str(data_dir), "sent_ids.json")
+    if backend == "json":
+        return JsonSentStore(json_path)
+    if backend != "sqlite":
+        logger.warning(f"⚠️ DEDUP_BACKEND inconnu '{backend}', utilisation de sqlite")
+    return SqliteSentStore(os.path.join(str(data_dir), "sent_ids.db"), json_path=json_path)
+
+
+class BloomFilter:
+    """
+    Filtre de Bloom compact pour répondre "certainement nouveau" sans lire le store
+    Un résultat positif doit toujours être confirmé par le store
+    """
+
+    MAGIC = b"NFBLOOM1"
+    HEADER = struct.Struct(">8sQIQ")  # magic, nb bits, nb hashes, nb IDs du store
+
+    def __init__(self, capacity, error_rate=0.01):
+        self.capacity = max(1, int(capacity))
+        self.size = max(8, int(-self.capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hashes = max(1, round(self.size / self.capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item_id):
+        digest = hashlib.blake2b(str(item_id).encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "big")
+        h2 = int.from_bytes(digest[8:], "big") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, item_id):
+        for pos in self._positions(item_id):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def might_contain(self, item_id):
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item_id))
+
+    def save(self, path):
+        """Écriture atomique: en-tête + tableau de bits"""
+        path = str(path)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(self.HEADER.pack(self.MAGIC, self.size, self.hashes, self.count))
+                f.write(self.bits)
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+    @classmethod
+    def load(cls, path):
+        with open(str(path), "rb") as f:
+            magic, size, hashes, count = cls.HEADER.unpack(f.read(cls.HEADER.size))
+            if magic != cls.MAGIC:
+                raise ValueError("format de filtre inconnu")
+            bloom = cls.__new__(cls)
+            bloom.size, bloom.hashes, bloom.count = size, hashes, count
+            bloom.capacity = max(1, round(size * (math.log(2) ** 2) / -math.log(0.01)))
+            bloom.bits = bytearray(f.read())
+        if len(bloom.bits) != (size + 7) // 8:
+            raise ValueError("filtre tronqué")
+        return bloom
+
+
+def load_bloom_filter(path, store, capacity):
+    """
+    Charge le filtre persisté s'il correspond au store, sinon le reconstruit
+    en parcourant les IDs du store (capacité doublée si nécessaire)
+    """
+    store_count = store.count()
+    try:
+        bloom = BloomFilter.load(path)
+        if bloom.count == store_count and store_count <= bloom.capacity:
+            return bloom
+        logger.info("🔄 Filtre de Bloom obsolète, reconstruction...")
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        logger.warning(f"⚠️ Filtre de Bloom illisible ({e}), reconstruction...")
+
+    while capacity < store_count * 2:
+        capacity *= 2
+    bloom = BloomFilter(capacity)
+    for item_id in store.iter_ids():
+        bloom.add(item_id)
+    bloom.save(path)
+    logger.info(f"✅ Filtre de Bloom construit ({bloom.count} IDs, {len(bloom.bits) // 1024} Ko)")
+    return bloom
+
+
+# ============================================================================
+# OUTBOX DISCORD
+# ============================================================================
+
+class Outbox:
+    """
+    File persistante des messages Discord en attente d'acquittement
+    Chaque message garde les IDs qu'il notifie: ils ne sont marqués envoyés
+    qu'une fois le message acquitté par Discord
+    Un message acquitté est d'abord marqué livré (delivered_at): après un crash avant
+    l'enregistrement de ses IDs, il est finalisé sans être renvoyé
+    """
+
+    def __init__(self, db_path):
+        self.db_path = str(db_path)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+        with self.lock, self.conn:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS outbox ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " webhook TEXT NOT NULL,"
+                " payload TEXT NOT NULL,"
+                " items TEXT NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " attempts INTEGER NOT NULL DEFAULT 0,"
+                " last_error TEXT,"
+                " delivered_at REAL)"
+            )
+            columns = {row[1] for row in self.conn.execute("PRAGMA table_info(outbox)")}
+            if "delivered_at" not in columns:
+                self.conn.execute("ALTER TABLE outbox ADD COLUMN delivered_at REAL")
+
+    def enqueue(self, webhook, payload, items):
+        """items: dict {item_id: {"title": ..., "sent_at": ...}} notifiés par ce message"""
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT INTO outbox (webhook, payload, items, created_at) VALUES (?, ?, ?, ?)",
+                (webhook, json.dumps(payload), json.dumps(items), time.time())
+            )
+
+    def pending(self):
+        """Messages à envoyer, du plus ancien au plus récent"""
+        return self._select("WHERE delivered_at IS NULL")
+
+    def delivered(self):
+        """Messages acquittés par Discord dont les IDs restent à enregistrer"""
+        return self._select("WHERE delivered_at IS NOT NULL")
+
+    def _select(self, where):
+        with self.lock:
+            rows = self.conn.execute(
+                f"SELECT id, webhook, payload, items, attempts FROM outbox {where} ORDER BY id"
+            ).fetchall()
+        return [
+            {
+                "id": row_id,
+                "webhook": webhook,
+                "payload": json.loads(payload),
+                "items": json.loads(items),
+                "attempts": attempts,
+            }
+            for row_id, webhook, payload, items, attempts in rows
+        ]
+
+    def pending_item_ids(self):
+        """IDs notifiés par des messages encore dans l'outbox (à envoyer ou livrés)"""
+        item_ids = set()
+        for message in self._select(""):
+            item_ids.update(message["items"])
+        return item_ids
+
+    def count(self):
+        """Messages restant à envoyer"""
+        with self.lock:
+            return self.conn.execute(
+                "SELECT COUNT(*) FROM outbox WHERE delivered_at IS NULL"
+            ).fetchone()[0]
+
+    def mark_delivered(self, message_id):
+        """Message acquitté par Discord: ne sera plus jamais renvoyé"""
+        with self.lock, self.conn:
+            self.conn.execute(
+                "UPDATE outbox SET delivered_at = ? WHERE id = ?", (time.time(), message_id)
+            )
+
+    def ack(self, message_id):
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM outbox WHERE id = ?", (message_id,))
+
+    def record_failure(self, message_id, error):
+        with self.lock, self.conn:
+            self.conn.execute(
+                "UPDATE outbox SET attempts = attempts + 1, last_error = ? WHERE id = ?",
+                (str(error)[:500], message_id)
+            )
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+# ============================================================================
+# QUOTAS D'API
+# ============================================================================
+
+class QuotaExhaustedError(Exception):
+    """Appel refusé: budget quotidien du fournisseur épuisé"""
+
+
+class QuotaTracker:
+    """
+    Budget quotidien + token bucket par fournisseur d'API, persistés en SQLite
+    Partagé entre processus (cron, daemon, runs manuels) via des transactions IMMEDIATE
+    limits: {provider: {"daily": budget (0 = illimité), "rate": req/s, "burst": taille du bucket}}
+    """
+
+    LOW_RATIO = 0.25
+    CRITICAL_RATIO = 0.05
+
+    def __init__(self, db_path, limits):
+        self.db_path = str(db_path)
+        self.limits = limits
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(
+            self.db_path, timeout=30, check_same_thread=False, isolation_level=None
+        )
+        with self.lock:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS api_quota ("
+                " provider TEXT NOT NULL,"
+                " day TEXT NOT NULL,"
+                " used INTEGER NOT NULL DEFAULT 0,"
+                " PRIMARY KEY (provider, day))"
+            )
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS api_bucket ("
+                " provider TEXT PRIMARY KEY,"
+                " tokens REAL NOT NULL,"
+                " updated_at REAL NOT NULL)"
+            )
+
+    @staticmethod
+    def today():
+        return time.strftime("%Y-%m-%d", time.gmtime())
+
+    def _used(self, provider, day):
+        row = self.conn.execute(
+            "SELECT used FROM api_quota WHERE provider = ? AND day = ?", (provider, day)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def try_acquire(self, provider, cost=1):
+        """
+        Réserve cost requêtes
+        Retourne (accordé, attente): attente > 0 si le token bucket est vide
+        """
+        limit = self.limits.get(provider, {})
+        daily = limit.get("daily", 0)
+        rate = limit.get("rate", 0)
+        burst = limit.get("burst", max(1, rate))
+        day = self.today()
+        now = time.time()
+
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                used = self._used(provider, day)
+                if daily and used + cost > daily:
+                    self.conn.execute("COMMIT")
+                    return False, 0
+
+                if rate:
+                    row = self.conn.execute(
+                        "SELECT tokens, updated_at FROM api_bucket WHERE provider = ?", (provider,)
+                    ).fetchone()
+                    tokens = burst if row is None else min(burst, row[0] + (now - row[1]) * rate)
+                    if tokens < cost:
+                        self.conn.execute("COMMIT")
+                        return False, (cost - tokens) / rate
+                    self.conn.execute(
+                        "INSERT OR REPLACE INTO api_bucket (provider, tokens, updated_at) VALUES (?, ?, ?)",
+                        (provider, tokens - cost, now)
+                    )
+
+                self.conn.execute(
+                    "INSERT INTO api_quota (provider, day, used) VALUES (?, ?, ?)"
+                    " ON CONFLICT (provider, day) DO UPDATE SET used = used + excluded.used",
+                    (provider, day, cost)
+                )
+                self.conn.execute("COMMIT")
+                return True, 0
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    def acquire(self, provider, cost=1):
+        """Attend un jeton si nécessaire; False si le budget quotidien est épuisé"""
+        while True:
+            granted, wait = self.try_acquire(provider, cost)
+            if granted:
+                return True
+            if not wait:
+                return False
+            time.sleep(wait)
+
+    def remaining(self, provider):
+        """Requêtes restantes aujourd'hui (None si illimité)"""
+        daily = self.limits.get(provider, {}).get("daily", 0)
+        if not daily:
+            return None
+        with self.lock:
+            used = self._used(provider, self.today())
+        return max(0, daily - used)
+
+    def level(self, provider):
+        """normal, low (< 25% du budget) ou critical (< 5%)"""
+        daily = self.limits.get(provider, {}).get("daily", 0)
+        remaining = self.remaining(provider)
+        if remaining is None:
+            return "normal"
+        if remaining <= daily * self.CRITICAL_RATIO:
+            return "critical"
+        if remaining <= daily * self.LOW_RATIO:
+            return "low"
+        return "normal"
+
+    def snapshot(self):
+        """État des quotas du jour pour l'interface web"""
+        day = self.today()
+        snapshot = {}
+        for provider, limit in self.limits.items():
+            with self.lock:
+                used = self._used(provider, day)
+            daily = limit.get("daily", 0)
+            snapshot[provider] = {
+                "day": day,
+                "used": used,
+                "budget": daily or None,
+                "remaining": max(0, daily - used) if daily else None,
+                "level": self.level(provider),
+            }
+        return snapshot
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+class RunLog:
+    """
+    Historique des runs du bot dans SQLite (un enregistrement JSON par run)
+    Lu par l'interface web: dernier run en une requête indexée, quelle que soit la taille des logs
+    """
+
+    def __init__(self, db_path, keep=1000):
+        self.db_path = str(db_path)
+        self.keep = keep
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+        with self.lock, self.conn:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS runs ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " started_at REAL NOT NULL,"
+                " finished_at REAL NOT NULL,"
+                " status TEXT NOT NULL,"
+                " data TEXT NOT NULL)"
+            )
+
+    def record(self, run):
+        """Ajoute un run et supprime les plus anciens au-delà de keep"""
+        with self.lock, self.conn:
+            cursor = self.conn.execute(
+                "INSERT INTO runs (started_at, finished_at, status, data) VALUES (?, ?, ?, ?)",
+                (run["started_at"], run["finished_at"], run["status"], json.dumps(run))
+            )
+            self.conn.execute("DELETE FROM runs WHERE id <= ?", (cursor.lastrowid - self.keep,))
+
+    def latest(self):
+        """Dernier run enregistré, ou None"""
+        runs = self.recent(1)
+        return runs[0] if runs else None
+
+    def recent(self, limit=20):
+        """Derniers runs, du plus récent au plus ancien"""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT data FROM runs ORDER BY id DESC LIMIT ?", (limit,)
+            ).fetchall()
+        return [json.loads(data) for (data,) in rows]
@@ -13,11 +13,14 @@ echo "🔍 Vérification des variables d'environnement..."
 # Variables obligatoires
 ERRORS=0
 
-if [ -z "$DISCORD_WEBHOOK" ]; then
+DISCORD_ROUTES_FILE=${DISCORD_ROUTES_FILE:-/app/data/routes.json}
+if [ -n "$DISCORD_WEBHOOK" ]; then
+    echo "✅ DISCORD_WEBHOOK: configuré"
+elif [ -f "$DISCORD_ROUTES_FILE" ]; then
+    echo "✅ DISCORD_WEBHOOK: non configuré (routage via $DISCORD_ROUTES_FILE)"
+else
     echo "❌ ERREUR: DISCORD_WEBHOOK manquant"
     ERRORS=$((ERRORS + 1))
-else
-    echo "✅ DISCORD_WEBHOOK: configuré"
 fi
 
 # Variables recommandées v3
@@ -60,9 +63,37 @@ echo ""
 echo "📝 Génération de la configuration pour cron..."
 cat > /app/.env_for_cron << EOF
 DISCORD_WEBHOOK=${DISCORD_WEBHOOK}
+DISCORD_ROUTES_FILE=${DISCORD_ROUTES_FILE}
 MDBLIST_API_KEY=${MDBLIST_API_KEY:-}
 TMDB_API_KEY=${TMDB_API_KEY:-}
 DAYS_BACK=${DAYS_BACK}
+COUNTRIES=${COUNTRIES:-FR}
+DEDUP_BACKEND=${DEDUP_BACKEND:-sqlite}
+DEDUP_BLOOM=${DEDUP_BLOOM:-false}
+DEDUP_BLOOM_CAPACITY=${DEDUP_BLOOM_CAPACITY:-100000}
+NETFLIX_LISTS_FILE=${NETFLIX_LISTS_FILE:-/app/data/lists.json}
+ENRICH_WORKERS=${ENRICH_WORKERS:-8}
+MDBLIST_MAX_CONCURRENCY=${MDBLIST_MAX_CONCURRENCY:-4}
+TMDB_MAX_CONCURRENCY=${TMDB_MAX_CONCURRENCY:-8}
+MDBLIST_DAILY_BUDGET=${MDBLIST_DAILY_BUDGET:-1000}
+MDBLIST_RATE_PER_SECOND=${MDBLIST_RATE_PER_SECOND:-5}
+MDBLIST_BUDGET_RESERVE=${MDBLIST_BUDGET_RESERVE:-20}
+TMDB_DAILY_BUDGET=${TMDB_DAILY_BUDGET:-0}
+TMDB_RATE_PER_SECOND=${TMDB_RATE_PER_SECOND:-40}
+MDBLIST_BATCH_SIZE=${MDBLIST_BATCH_SIZE:-200}
+HTTP_TIMEOUTS=${HTTP_TIMEOUTS:-}
+BREAKER_FAILURE_THRESHOLD=${BREAKER_FAILURE_THRESHOLD:-3}
+BREAKER_SLOW_CALL_SECONDS=${BREAKER_SLOW_CALL_SECONDS:-5}
+BREAKER_COOLDOWN_SECONDS=${BREAKER_COOLDOWN_SECONDS:-300}
+DISCORD_MAX_RETRIES=${DISCORD_MAX_RETRIES:-5}
+DISCORD_OUTBOX_MAX_ATTEMPTS=${DISCORD_OUTBOX_MAX_ATTEMPTS:-5}
+CACHE_MAX_ENTRIES=${CACHE_MAX_ENTRIES:-5000}
+CACHE_TTL_MDBLIST_HOURS=${CACHE_TTL_MDBLIST_HOURS:-24}
+CACHE_TTL_TMDB_HOURS=${CACHE_TTL_TMDB_HOURS:-168}
+CACHE_TTL_NOT_FOUND_HOURS=${CACHE_TTL_NOT_FOUND_HOURS:-6}
+LOG_MAX_MB=${LOG_MAX_MB:-10}
+LOG_BACKUP_COUNT=${LOG_BACKUP_COUNT:-30}
+LOG_RETENTION_DAYS=${LOG_RETENTION_DAYS:-14}
 FLASK_SECRET_KEY=${FLASK_SECRET_KEY:-netflix-bot-v3-secret}
 EOF
 echo "✅ Configuration cron créée"
@@ -79,28 +110,56 @@ else
 fi
 echo ""
 
-# Démarrer le service cron
-echo "⏰ Démarrage du service cron..."
-
-# Alpine utilise crond, Debian utilise cron
-if command -v crond &> /dev/null; then
-    # Alpine
-    crond -b -l 2
-    echo "✅ Service crond (Alpine) démarré"
-elif command -v cron &> /dev/null; then
-    # Debian
-    service cron start
-    echo "✅ Service cron (Debian) démarré"
-else
-    echo "⚠️  Aucun service cron trouvé"
-fi
-
-# Vérifier que cron a démarré
-sleep 2
-if pgrep -x crond > /dev/null 2>&1 || pgrep -x cron > /dev/null 2>&1; then
-    echo "✅ Cron actif et opérationnel"
+# Mode d'exécution: cron (défaut) ou daemon (planification interne)
+BOT_MODE=${BOT_MODE:-cron}
+DAEMON_PID=""
+
+# Superviseur du daemon: relancé s'il s'arrête, SIGTERM transmis (fin du run en cours)
+supervise_daemon() {
+    local child=""
+    trap 'kill -TERM "$child" 2>/dev/null; wait "$child"; exit 0' TERM INT
+    while true; do
+        python3 netflix_bot.py --daemon >> /app/logs/cron.log 2>&1 &
+        child=$!
+        local status=0
+        wait "$child" || status=$?
+        echo "⚠️  $(date) Daemon arrêté (code $status), redémarrage dans 10s" >> /app/logs/cron.log
+        sleep 10 &
+        wait $! || true
+    done
+}
+
+if [ "$BOT_MODE" = "daemon" ]; then
+    echo "🔁 Démarrage du bot en mode daemon (toutes les ${POLL_INTERVAL_MINUTES:-60} min)..."
+    cd /app
+    supervise_daemon &
+    DAEMON_PID=$!
+    echo "✅ Daemon démarré (superviseur PID $DAEMON_PID)"
+    echo ""
 else
-    echo "⚠️  Cron non disponible (tâches planifiées désactivées)"
+    # Démarrer le service cron
+    echo "⏰ Démarrage du service cron..."
+
+    # Alpine utilise crond, Debian utilise cron
+    if command -v crond &> /dev/null; then
+        # Alpine
+        crond -b -l 2
+        echo "✅ Service crond (Alpine) démarré"
+    elif command -v cron &> /dev/null; then
+        # Debian
+        service cron start
+        echo "✅ Service cron (Debian) démarré"
+    else
+        echo "⚠️  Aucun service cron trouvé"
+    fi
+
+    # Vérifier que cron a démarré
+    sleep 2
+    if pgrep -x crond > /dev/null 2>&1 || pgrep -x cron > /dev/null 2>&1; then
+        echo "✅ Cron actif et opérationnel"
+    else
+        echo "⚠️  Cron non disponible (tâches planifiées désactivées)"
+    fi
 fi
 
 # Afficher le crontab actif
@@ -116,17 +175,45 @@ echo "=================================================="
 echo "🌐 Interface web: http://localhost:5000"
 echo "👤 Login par défaut: admin / admin123"
 echo "📡 API Source: mdblist.com"
-echo "⏰ Planification: Quotidien à 9h00"
+if [ "$BOT_MODE" = "daemon" ]; then
+    echo "⏰ Planification: daemon, toutes les ${POLL_INTERVAL_MINUTES:-60} min"
+else
+    echo "⏰ Planification: Quotidien à 9h00"
+fi
 echo "=================================================="
 echo ""
 
-# Démarrer Flask
+# Démarrer l'interface web
+# WEB_SERVER=gunicorn (défaut): workers multiples, arrêt propre sur SIGTERM
+# WEB_SERVER=dev: serveur de développement Flask (FLASK_DEBUG=1 pour le debugger)
+WEB_SERVER=${WEB_SERVER:-gunicorn}
 if [ -f /app/web_interface.py ]; then
-    echo "🌐 Démarrage de l'interface web Flask..."
     cd /app
-    exec python3 web_interface.py
+    if [ "$WEB_SERVER" = "dev" ]; then
+        echo "🌐 Démarrage de l'interface web Flask (serveur de développement)..."
+        WEB_COMMAND=(python3 web_interface.py)
+    else
+        echo "🌐 Démarrage de l'interface web (gunicorn, ${WEB_WORKERS:-2} workers x ${WEB_THREADS:-8} threads)..."
+        WEB_COMMAND=(gunicorn -c /app/gunicorn.conf.py web_interface:app)
+    fi
 else
     echo "⚠️  Interface web non trouvée"
     echo "🔄 Container en mode monitoring..."
-    tail -f /dev/null
+    WEB_COMMAND=(tail -f /dev/null)
 fi
+
+# Mode cron: l'interface web remplace ce script (PID 1, reçoit SIGTERM directement)
+if [ -z "$DAEMON_PID" ]; then
+    exec "${WEB_COMMAND[@]}"
+fi
+
+# Mode daemon: ce script reste PID 1 et transmet SIGTERM à l'interface web et au daemon
+"${WEB_COMMAND[@]}" &
+WEB_PID=$!
+trap 'kill -TERM "$WEB_PID" "$DAEMON_PID" 2>/dev/null' TERM INT
+WEB_STATUS=0
+wait "$WEB_PID" || WEB_STATUS=$?
+kill -TERM "$WEB_PID" "$DAEMON_PID" 2>/dev/null || true
+wait "$WEB_PID" 2>/dev/null || true
+wait "$DAEMON_PID" 2>/dev/null || true
+exit $WEB_STATUS
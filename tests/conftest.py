@@ -0,0 +1,56 @@
+"""
+Fixtures communes des tests
+Le bot écrit dans /app/data: les chemins sont redirigés vers un dossier temporaire
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import netflix_bot_v3 as bot  # noqa: E402
+
+DATA_FILES = {
+    "CACHE_FILE": "metadata_cache.db",
+    "BLOOM_FILE": "sent_ids.bloom",
+    "OUTBOX_FILE": "outbox.db",
+    "QUOTA_FILE": "quota.db",
+    "LIST_STATE_FILE": "list_state.json",
+    "BREAKER_FILE": "circuit_breakers.json",
+    "RUNS_FILE": "runs.db",
+    "METRICS_FILE": "metrics.db",
+    "RUN_LOCK_FILE": "run.lock",
+    "NETFLIX_LISTS_FILE": "lists.json",
+    "DISCORD_ROUTES_FILE": "routes.json",
+    "CRON_ENV_FILE": ".env_for_cron",
+}
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    """Données du bot dans tmp_path"""
+    monkeypatch.setattr(bot, "DATA_DIR", tmp_path)
+    # Réglages relus à chaud par le daemon: restaurés après le test
+    monkeypatch.setattr(bot, "DAYS_BACK", bot.DAYS_BACK)
+    monkeypatch.setattr(bot, "COUNTRIES", list(bot.COUNTRIES))
+    for name, filename in DATA_FILES.items():
+        monkeypatch.setattr(bot, name, tmp_path / filename)
+    return tmp_path
+
+
+@pytest.fixture
+def make_notifier(data_dir):
+    """Fabrique de NetflixNotifier isolés (fermés en fin de test)"""
+    notifiers = []
+
+    def make(**kwargs):
+        notifier = bot.NetflixNotifier(**kwargs)
+        notifier.run = bot.RunRecorder(notifier.metrics)
+        notifiers.append(notifier)
+        return notifier
+
+    yield make
+    for notifier in notifiers:
+        notifier.http.close()
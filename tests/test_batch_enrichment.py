@@ -0,0 +1,219 @@
+"""
+Enrichissement mdblist par lots: nombre de requêtes contre un serveur local (stub)
+"""
+
+import json
+import math
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import netflix_bot_v3 as bot
+
+
+class StubMdblist(BaseHTTPRequestHandler):
+    """mdblist minimal: POST /{provider}/{media_type} (lot) et GET /{provider}/{media_type}/{id}"""
+
+    def log_message(self, format, *args):
+        pass
+
+    def reply(self, status, data):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        ids = json.loads(self.rfile.read(length))["ids"]
+        path = self.path.split("?")[0]
+        self.server.record(("POST", path, ids))
+        if self.server.batch_status != 200:
+            self.reply(self.server.batch_status, {"error": "indisponible"})
+            return
+        provider = path.strip("/").split("/")[0]
+        self.reply(200, [
+            {"ids": {provider: media_id}, "title": f"lot {media_id}"}
+            for media_id in ids if media_id not in self.server.unknown
+        ])
+
+    def do_GET(self):
+        path = self.path.split("?")[0]
+        self.server.record(("GET", path, None))
+        media_id = path.rsplit("/", 1)[1]
+        if media_id in self.server.unknown:
+            self.reply(404, {"error": "introuvable"})
+            return
+        self.reply(200, {"title": f"unitaire {media_id}"})
+
+
+@pytest.fixture
+def stub():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubMdblist)
+    server.requests = []
+    server.batch_status = 200
+    server.unknown = set()
+    lock = threading.Lock()
+
+    def record(entry):
+        with lock:
+            server.requests.append(entry)
+
+    server.record = record
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def notifier(make_notifier, stub, monkeypatch):
+    monkeypatch.setattr(bot, "MDBLIST_API_KEY", "test-key")
+    monkeypatch.setattr(bot, "TMDB_API_KEY", None)
+    monkeypatch.setattr(bot, "MDBLIST_BATCH_SIZE", 4)
+    # Pas d'ouverture du circuit pendant le test du repli
+    monkeypatch.setitem(bot.BREAKER_SETTINGS, "failure_threshold", 100)
+    notifier = make_notifier()
+
+    # Requêtes mdblist redirigées vers le stub
+    base = f"http://127.0.0.1:{stub.server_address[1]}"
+    request = notifier.http.request
+    monkeypatch.setattr(
+        notifier.http, "request",
+        lambda method, url, **kwargs: request(method, url.replace(bot.MDBLIST_API_BASE, base), **kwargs)
+    )
+    return notifier
+
+
+def make_candidates():
+    """
+    22 candidats: films (dont 3 avec un ID IMDb) et séries, dont 2 doublons
+    """
+    candidates = []
+    for i in range(1, 13):
+        item = {"id": i, "title": f"film {i}", "mediatype": "movie"}
+        if i > 9:
+            item["imdb_id"] = f"tt{i:07d}"
+        candidates.append((i, "movie", item))
+    for i in range(101, 109):
+        candidates.append((i, "show", {"id": i, "title": f"série {i}", "mediatype": "show"}))
+    candidates.append((5, "movie", {"id": 5, "title": "film 5", "mediatype": "movie"}))
+    candidates.append((103, "show", {"id": 103, "title": "série 103", "mediatype": "show"}))
+    return candidates
+
+
+def expected_missing(notifier):
+    """IDs absents du cache par (provider, media_type), après avoir mis en cache les films 1 et 2"""
+    for i in (1, 2):
+        notifier.cache.set("mdblist", "movie", f"tmdb:{i}", {"title": f"cache {i}"})
+    return {
+        "/tmdb/movie": [str(i) for i in range(3, 10)],
+        "/imdb/movie": [f"tt{i:07d}" for i in range(10, 13)],
+        "/tmdb/show": [str(i) for i in range(101, 109)],
+    }
+
+
+def test_one_post_per_chunk(notifier, stub):
+    missing = expected_missing(notifier)
+    candidates = make_candidates()
+
+    notifier.enrich_items(candidates)
+
+    posts = [r for r in stub.requests if r[0] == "POST"]
+    assert not [r for r in stub.requests if r[0] == "GET"]
+    for path, ids in missing.items():
+        chunks = [r[2] for r in posts if r[1] == path]
+        assert len(chunks) == math.ceil(len(ids) / bot.MDBLIST_BATCH_SIZE)
+        assert all(len(chunk) <= bot.MDBLIST_BATCH_SIZE for chunk in chunks)
+        assert sorted(i for chunk in chunks for i in chunk) == sorted(ids)
+    assert len(posts) == 2 + 1 + 2
+
+    titles = {item["title"] for _, _, item in candidates}
+    assert {"cache 1", "cache 2", "lot 3", "lot tt0000012", "lot 108"} <= titles
+
+    # Deuxième passage: tout vient du cache
+    stub.requests.clear()
+    notifier.enrich_items(make_candidates())
+    assert stub.requests == []
+
+
+def test_fallback_to_single_requests_on_5xx(notifier, stub):
+    missing = expected_missing(notifier)
+    stub.batch_status = 503
+
+    details = notifier.fetch_media_details(make_candidates(), pool=FakePool())
+
+    posts = [r for r in stub.requests if r[0] == "POST"]
+    gets = sorted(r[1] for r in stub.requests if r[0] == "GET")
+    assert len(posts) == sum(math.ceil(len(ids) / bot.MDBLIST_BATCH_SIZE) for ids in missing.values())
+    assert gets == sorted(f"{path}/{i}" for path, ids in missing.items() for i in ids)
+    assert details[("tmdb", "movie", "3")]["title"] == "unitaire 3"
+    assert details[("tmdb", "movie", "1")]["title"] == "cache 1"
+
+
+def test_low_budget_keeps_the_top_of_each_list(notifier, stub):
+    expected_missing(notifier)
+
+    details = notifier.fetch_media_details(make_candidates(), pool=FakePool(), max_calls=2)
+
+    # Lots en tête de liste: séries 101-104 (positions 0-3), films 3-6 (positions 2-5)
+    posts = sorted((r[1], tuple(r[2])) for r in stub.requests if r[0] == "POST")
+    assert posts == [
+        ("/tmdb/movie", ("3", "4", "5", "6")),
+        ("/tmdb/show", ("101", "102", "103", "104")),
+    ]
+    assert details[("tmdb", "show", "101")]["title"] == "lot 101"
+    assert ("tmdb", "movie", "7") not in details
+    assert ("tmdb", "show", "105") not in details
+
+
+def test_half_open_circuit_uses_stale_cache_without_spending_quota(notifier, stub, monkeypatch):
+    expected_missing(notifier)
+    notifier.cache.set("mdblist", "movie", "tmdb:3", {"title": "ancien 3"})
+    monkeypatch.setitem(notifier.cache.ttls, "mdblist", -1)
+    # Appel d'essai déjà en cours: available() vrai, allow() refuse
+    breaker = notifier.breakers["mdblist"]
+    breaker.state = breaker.HALF_OPEN
+    breaker.probe_in_flight = True
+    remaining = notifier.quota.remaining("mdblist")
+
+    details = notifier.fetch_media_details(make_candidates(), pool=FakePool())
+
+    assert stub.requests == []
+    assert notifier.quota.remaining("mdblist") == remaining
+    assert details[("tmdb", "movie", "3")] == {"title": "ancien 3", "stale": True}
+    assert details[("tmdb", "show", "101")] is None
+    assert notifier.get_media_details(tmdb_id="108", media_type="show") is None
+    assert notifier.quota.remaining("mdblist") == remaining
+
+
+def test_unknown_ids_are_negatively_cached(notifier, stub):
+    stub.unknown = {"4", "105"}
+    expected_missing(notifier)
+
+    details = notifier.fetch_media_details(make_candidates(), pool=FakePool())
+    assert details[("tmdb", "movie", "4")] is None
+    assert details[("tmdb", "movie", "3")]["title"] == "lot 3"
+
+    # Run suivant: ni lot ni requête unitaire pour les titres introuvables
+    stub.requests.clear()
+    details = notifier.fetch_media_details(make_candidates(), pool=FakePool())
+    assert stub.requests == []
+    assert details[("tmdb", "show", "105")] is None
+
+    # Réponse 404 d'une requête unitaire: mise en cache négatif elle aussi
+    stub.unknown.add("999")
+    assert notifier.get_media_details(tmdb_id="999", media_type="movie") is None
+    assert notifier.get_media_details(tmdb_id="999", media_type="movie") is None
+    assert [r[1] for r in stub.requests] == ["/tmdb/movie/999"]
+
+
+class FakePool:
+    """Exécution séquentielle (ordre des requêtes déterministe)"""
+
+    def map(self, fn, iterable):
+        return [fn(x) for x in iterable]
@@ -0,0 +1,59 @@
+"""
+Mode daemon: état et réglages modifiés par d'autres processus pris en compte entre deux runs
+"""
+
+import netflix_bot_v3 as bot
+
+
+def record(title):
+    return {"title": title, "sent_at": "2026-01-01T00:00:00"}
+
+
+def test_ids_sent_by_another_process_are_not_new(make_notifier):
+    daemon = make_notifier(daemon=True)
+    daemon.save_sent_ids({"1": record("déjà là")})
+
+    # Run manuel (/api/run) dans un autre processus, sans filtre de Bloom
+    other = make_notifier()
+    other.save_sent_ids({"4242": record("run manuel")})
+
+    daemon.reload_config()
+    assert daemon.is_already_sent("4242")
+    assert daemon.is_already_sent("1")
+    assert not daemon.is_already_sent("9999")
+
+
+def test_stale_filter_is_refreshed_before_saving(make_notifier):
+    daemon = make_notifier(daemon=True)
+    other = make_notifier()
+    other.save_sent_ids({"4242": record("run manuel")})
+
+    # Sans reload_config: l'ajout du daemon ne doit pas masquer l'écart avec le store
+    daemon.save_sent_ids({"7": record("daemon")})
+    assert daemon.bloom.count == daemon.sent_store.count() == 2
+    assert daemon.is_already_sent("4242")
+    assert daemon.is_already_sent("7")
+
+
+def test_reset_empties_the_daemon_filter(make_notifier):
+    daemon = make_notifier(daemon=True)
+    daemon.save_sent_ids({"1": record("a"), "2": record("b")})
+    make_notifier().sent_store.clear()
+
+    daemon.reload_config()
+    assert daemon.bloom.count == 0
+    assert not daemon.is_already_sent("1")
+
+
+def test_dashboard_settings_are_reloaded(make_notifier, data_dir):
+    daemon = make_notifier(daemon=True)
+    (data_dir / ".env_for_cron").write_text("DAYS_BACK=12\nCOUNTRIES=be, ch\n")
+
+    daemon.reload_config()
+    assert bot.DAYS_BACK == 12
+    assert bot.COUNTRIES == ["BE", "CH"]
+
+    # Valeur invalide: réglage précédent conservé
+    (data_dir / ".env_for_cron").write_text("DAYS_BACK=abc\n")
+    daemon.reload_config()
+    assert bot.DAYS_BACK == 12
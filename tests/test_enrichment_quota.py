@@ -0,0 +1,58 @@
+"""
+Enrichissement sous quota bas: chaque fournisseur suit son propre niveau
+"""
+
+import pytest
+
+import netflix_bot_v3 as bot
+
+
+@pytest.fixture
+def notifier(make_notifier, monkeypatch):
+    monkeypatch.setattr(bot, "MDBLIST_API_KEY", "test-key")
+    monkeypatch.setattr(bot, "TMDB_API_KEY", "test-key")
+    notifier = make_notifier()
+    notifier.calls = {"max_calls": [], "overviews": []}
+
+    def fetch_media_details(candidates, pool, max_calls=None):
+        notifier.calls["max_calls"].append(max_calls)
+        return {}
+
+    def get_french_overview(tmdb_id, media_type):
+        notifier.calls["overviews"].append(tmdb_id)
+        return f"synopsis {tmdb_id}"
+
+    monkeypatch.setattr(notifier, "fetch_media_details", fetch_media_details)
+    monkeypatch.setattr(notifier, "get_french_overview", get_french_overview)
+    return notifier
+
+
+def set_levels(notifier, monkeypatch, **levels):
+    monkeypatch.setattr(notifier.quota, "level", lambda provider: levels[provider])
+    monkeypatch.setattr(notifier.quota, "remaining", lambda provider: 10)
+
+
+def candidates():
+    return [(i, "movie", {"id": i, "title": f"film {i}", "mediatype": "movie"}) for i in (1, 2)]
+
+
+def test_critical_tmdb_keeps_mdblist(notifier, monkeypatch):
+    set_levels(notifier, monkeypatch, mdblist="normal", tmdb="critical")
+    items = candidates()
+
+    notifier.enrich_items(items)
+
+    assert notifier.calls["max_calls"] == [None]
+    assert notifier.calls["overviews"] == []
+    assert all(item["overview_fr"] is None for _, _, item in items)
+
+
+def test_critical_mdblist_keeps_tmdb(notifier, monkeypatch):
+    set_levels(notifier, monkeypatch, mdblist="critical", tmdb="normal")
+    items = candidates()
+
+    notifier.enrich_items(items)
+
+    assert notifier.calls["max_calls"] == [0]
+    assert sorted(notifier.calls["overviews"]) == [1, 2]
+    assert items[0][2]["overview_fr"] == "synopsis 1"
@@ -0,0 +1,51 @@
+"""
+Synopsis français: la description mdblist (en anglais) ne remplace pas l'appel TMDB
+"""
+
+import netflix_bot_v3 as bot
+
+
+def test_french_original_title_still_gets_tmdb_overview(make_notifier, monkeypatch):
+    monkeypatch.setattr(bot, "MDBLIST_API_KEY", "")
+    monkeypatch.setattr(bot, "TMDB_API_KEY", "test-key")
+    notifier = make_notifier()
+    requested = []
+    monkeypatch.setattr(
+        notifier, "get_french_overview",
+        lambda tmdb_id, media_type: requested.append(tmdb_id) or "Synopsis en français"
+    )
+    item = {"id": 7, "mediatype": "movie", "language": "fr", "description": "English synopsis"}
+
+    notifier.enrich_item(7, "movie", item, {})
+
+    assert requested == [7]
+    assert item["overview_fr"] == "Synopsis en français"
+    assert "Synopsis en français" in notifier.create_discord_embed(item)["description"]
+
+
+def test_overview_cached_under_fr_fr_needs_no_request(make_notifier, monkeypatch):
+    monkeypatch.setattr(bot, "TMDB_API_KEY", "test-key")
+    notifier = make_notifier()
+    notifier.cache.set("tmdb", "movie", 7, "Déjà en cache")
+    monkeypatch.setattr(notifier.http, "request", unexpected_request)
+
+    assert notifier.get_french_overview(7, "movie") == "Déjà en cache"
+
+
+def test_unknown_tmdb_id_is_negatively_cached(make_notifier, monkeypatch):
+    monkeypatch.setattr(bot, "TMDB_API_KEY", "test-key")
+    notifier = make_notifier()
+    requested = []
+
+    class NotFound:
+        status_code = 404
+
+    monkeypatch.setattr(notifier.http, "request", lambda *args, **kwargs: requested.append(args) or NotFound())
+
+    assert notifier.get_french_overview(404404, "movie") is None
+    assert notifier.get_french_overview(404404, "movie") is None
+    assert len(requested) == 1
+
+
+def unexpected_request(*args, **kwargs):
+    raise AssertionError("requête TMDB inattendue")
@@ -0,0 +1,86 @@
+"""
+Listes Netflix: récupération parallèle bornée, snapshot sans les items non notifiés
+"""
+
+import threading
+import time
+
+import netflix_bot_v3 as bot
+from netflix_storage import read_json
+
+
+class FakeResponse:
+    status_code = 200
+    headers = {"ETag": '"v1"', "Last-Modified": "Sat, 17 Oct 2026 08:00:00 GMT"}
+
+    def __init__(self, items):
+        self.items = items
+
+    def json(self):
+        return self.items
+
+    def raise_for_status(self):
+        pass
+
+
+def test_unrouted_item_is_offered_again(make_notifier, monkeypatch):
+    monkeypatch.setattr(bot, "MDBLIST_API_KEY", "")
+    monkeypatch.setattr(bot, "TMDB_API_KEY", None)
+    monkeypatch.setattr(bot, "DISCORD_WEBHOOK", None)
+    notifier = make_notifier()
+    notifier.list_sources = [{"region": None, "media_type": "movie", "username": "u", "listname": "films"}]
+    notifier.routes = [{"webhooks": ["https://discord.test/series"], "media_types": ["show"]}]
+    items = [{"id": 1, "title": "film 1", "mediatype": "movie"}, {"id": 2, "title": "film 2", "mediatype": "movie"}]
+    requests = []
+
+    def get(url, headers=None):
+        requests.append(dict(headers or {}))
+        return FakeResponse([dict(item) for item in items])
+
+    monkeypatch.setattr(notifier.http, "get", get)
+    posts = []
+    monkeypatch.setattr(notifier.discord, "post", lambda *a: posts.append(a) or (True, None, False))
+
+    # Aucun webhook pour les films: rien n'est envoyé, rien n'entre dans le snapshot
+    notifier.run_pipeline(notifier.run)
+    assert posts == []
+    state = read_json(bot.LIST_STATE_FILE)["u/films"]
+    assert state["ids"] == []
+    assert state["etag"] is None
+
+    # Routage corrigé: les deux films sont proposés et notifiés
+    notifier.routes.append({"webhooks": ["https://discord.test/films"], "media_types": ["movie"]})
+    notifier.list_state = notifier.load_list_state()
+    notifier.run_pipeline(notifier.run)
+    # Pas de requête conditionnelle (un 304 masquerait les films)
+    assert requests[-1] == {}
+    assert len(posts) == 1
+    assert notifier.is_already_sent(1) and notifier.is_already_sent(2)
+    assert read_json(bot.LIST_STATE_FILE)["u/films"]["ids"] == ["1", "2"]
+
+
+def test_list_fetch_threads_are_bounded(make_notifier, monkeypatch):
+    monkeypatch.setattr(bot, "ENRICH_WORKERS", 2)
+    notifier = make_notifier()
+    notifier.list_sources = [
+        {"region": f"C{i}", "media_type": "movie", "username": "u", "listname": f"films-{i}"}
+        for i in range(6)
+    ]
+    lock = threading.Lock()
+    running = {"now": 0, "max": 0}
+
+    def fetch_list(source):
+        with lock:
+            running["now"] += 1
+            running["max"] = max(running["max"], running["now"])
+        time.sleep(0.05)
+        with lock:
+            running["now"] -= 1
+        return [{"id": 1, "title": "film 1"}]
+
+    monkeypatch.setattr(notifier, "fetch_list", fetch_list)
+
+    releases = notifier.get_netflix_releases(media_types=("movie",))
+
+    assert running["max"] == 2
+    assert releases["movie"][0]["regions"] == [f"C{i}" for i in range(6)]
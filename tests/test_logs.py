@@ -0,0 +1,63 @@
+"""
+Handler de log partagé: peu d'appels système par ligne, rotation vue par les autres processus
+"""
+
+import glob
+import gzip
+import logging
+import os
+
+import netflix_logs
+from netflix_logs import SharedRotatingFileHandler
+
+
+def record(message):
+    return logging.LogRecord("test", logging.INFO, __file__, 0, message, None, None)
+
+
+def test_lock_and_rotation_checks_are_not_per_line(tmp_path, monkeypatch):
+    handler = SharedRotatingFileHandler(tmp_path / "bot.log")
+    calls = {"open": 0, "stat": 0}
+    real_open, real_stat = os.open, os.stat
+
+    def counting_open(*args, **kwargs):
+        calls["open"] += 1
+        return real_open(*args, **kwargs)
+
+    def counting_stat(*args, **kwargs):
+        calls["stat"] += 1
+        return real_stat(*args, **kwargs)
+
+    monkeypatch.setattr(os, "open", counting_open)
+    monkeypatch.setattr(os, "stat", counting_stat)
+    for n in range(200):
+        handler.handle(record(f"ligne {n}"))
+    monkeypatch.undo()
+    handler.close()
+
+    assert calls == {"open": 1, "stat": 1}
+    assert len((tmp_path / "bot.log").read_text().splitlines()) == 200
+
+
+def test_rotation_by_another_process_is_followed(tmp_path, monkeypatch):
+    monkeypatch.setattr(netflix_logs, "ROLLOVER_CHECK_SECONDS", 0)
+    path = tmp_path / "bot.log"
+    web = SharedRotatingFileHandler(path, max_bytes=10 ** 6)
+    bot = SharedRotatingFileHandler(path, max_bytes=50)
+
+    web.handle(record("web avant"))
+    bot.handle(record("bot: un message assez long pour dépasser la taille maximale"))
+    bot.handle(record("bot après rotation"))
+    web.handle(record("web après rotation"))
+    # Vérification suivante du processus qui a fait tourner le log: segment compressé
+    bot.handle(record("bot encore"))
+    web.close()
+    bot.close()
+
+    assert path.read_text().splitlines() == ["bot après rotation", "web après rotation", "bot encore"]
+    segments = glob.glob(str(path) + ".*.gz")
+    assert len(segments) == 1
+    with gzip.open(segments[0], "rt", encoding="utf-8") as f:
+        assert f.read().splitlines() == [
+            "web avant", "bot: un message assez long pour dépasser la taille maximale"
+        ]
@@ -0,0 +1,44 @@
+"""
+Exposition Prometheus: histogrammes complets (toutes les bornes pour chaque série)
+"""
+
+from netflix_metrics import DEFAULT_BUCKETS, Metrics, connect, render_prometheus
+
+
+def bucket_lines(text, series):
+    return [line for line in text.splitlines() if line.startswith("netflix_run_phase_seconds_bucket") and series in line]
+
+
+def test_every_bucket_is_rendered(tmp_path):
+    db_path = tmp_path / "metrics.db"
+    metrics = Metrics(db_path)
+    metrics.observe("netflix_run_phase_seconds", 0.3, phase="fetch")
+    metrics.flush()
+
+    lines = bucket_lines(render_prometheus(db_path), 'phase="fetch"')
+
+    assert len(lines) == len(DEFAULT_BUCKETS) + 1
+    assert lines[:4] == [
+        'netflix_run_phase_seconds_bucket{le="0.05",phase="fetch"} 0',
+        'netflix_run_phase_seconds_bucket{le="0.1",phase="fetch"} 0',
+        'netflix_run_phase_seconds_bucket{le="0.25",phase="fetch"} 0',
+        'netflix_run_phase_seconds_bucket{le="0.5",phase="fetch"} 1',
+    ]
+    assert lines[-1] == 'netflix_run_phase_seconds_bucket{le="+Inf",phase="fetch"} 1'
+
+
+def test_buckets_missing_from_older_data_are_filled(tmp_path):
+    db_path = tmp_path / "metrics.db"
+    conn = connect(db_path)
+    with conn:
+        conn.executemany(
+            "INSERT INTO metric_samples (name, labels, value) VALUES (?, ?, ?)",
+            [("netflix_run_phase_seconds_bucket", f'{{le="{le}",phase="send"}}', 2)
+             for le in ("0.5", "1", "2.5", "5", "10", "30", "60", "120", "300", "+Inf")]
+        )
+    conn.close()
+
+    lines = bucket_lines(render_prometheus(db_path), 'phase="send"')
+
+    assert len(lines) == len(DEFAULT_BUCKETS) + 1
+    assert [line.rsplit(" ", 1)[1] for line in lines[:4]] == ["0", "0", "0", "2"]
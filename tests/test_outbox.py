@@ -0,0 +1,47 @@
+"""
+Outbox Discord: un message acquitté n'est jamais renvoyé, même après un crash
+"""
+
+import pytest
+
+
+class Crash(Exception):
+    pass
+
+
+def test_crash_between_delivery_and_save_does_not_resend(make_notifier, monkeypatch):
+    notifier = make_notifier()
+    items = {"42": {"title": "Titre", "sent_at": "2026-01-01T00:00:00"}}
+    notifier.outbox.enqueue("https://discord.test/hook", {"embeds": [{"title": "Titre"}]}, items)
+    posts = []
+    monkeypatch.setattr(notifier.discord, "post", lambda *a: posts.append(a) or (True, None, False))
+
+    # Crash juste après l'acquittement Discord, avant l'enregistrement des IDs
+    def crash(records):
+        raise Crash()
+    monkeypatch.setattr(notifier, "save_sent_ids", crash)
+    with pytest.raises(Crash):
+        notifier.send_to_discord()
+    assert len(posts) == 1
+    assert notifier.outbox.count() == 0
+    assert notifier.outbox.pending_item_ids() == {"42"}
+
+    # Redémarrage: IDs enregistrés sans nouvel envoi
+    restarted = make_notifier()
+    monkeypatch.setattr(restarted.discord, "post", lambda *a: posts.append(a) or (True, None, False))
+    restarted.finish_delivered()
+    assert restarted.send_to_discord()
+    assert len(posts) == 1
+    assert restarted.is_already_sent("42")
+    assert restarted.outbox.delivered() == []
+    assert restarted.outbox.pending_item_ids() == set()
+
+
+def test_delivered_message_is_acked_after_save(make_notifier, monkeypatch):
+    notifier = make_notifier()
+    notifier.outbox.enqueue("https://discord.test/hook", {"embeds": [{}]}, {"7": {"title": "x"}})
+    monkeypatch.setattr(notifier.discord, "post", lambda *a: (True, None, False))
+
+    assert notifier.send_to_discord()
+    assert notifier.is_already_sent("7")
+    assert notifier.outbox.pending() == notifier.outbox.delivered() == []
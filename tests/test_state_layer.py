@@ -0,0 +1,93 @@
+"""
+Couche d'état partagée: écrivains concurrents dans plusieurs processus
+Aucune mise à jour perdue, aucun lecteur ne voit un fichier partiel
+"""
+
+import json
+import multiprocessing
+
+from netflix_storage import JsonSentStore, read_json, update_env_file, update_json
+
+WRITERS = 6
+UPDATES = 150
+HEADER = ["# configuration", "DISCORD_WEBHOOK=https://discord.test/hook"]
+
+# fcntl/flock: Linux uniquement, comme le conteneur
+context = multiprocessing.get_context("fork")
+
+
+def increment(data, writer, n):
+    data["count"] = data.get("count", 0) + 1
+    data[f"w{writer}"] = n
+
+
+def writer(paths, writer_id):
+    store = JsonSentStore(paths["sent"])
+    for n in range(UPDATES):
+        update_json(paths["json"], lambda data: increment(data, writer_id, n), default={}, indent=2)
+        update_env_file(paths["env"], {f"KEY_{writer_id}": n, "DAYS_BACK": n % 30 + 1})
+        store.add_many({f"{writer_id}-{n}": {"title": f"titre {n}"}})
+
+
+def reader(paths, stop, errors):
+    """Relit les fichiers en boucle sans verrou: doivent toujours être complets"""
+    while not stop.is_set():
+        try:
+            with open(paths["json"]) as f:
+                json.load(f)
+            with open(paths["sent"]) as f:
+                json.load(f)
+            with open(paths["env"]) as f:
+                lines = f.read().splitlines()
+            if lines[:2] != HEADER or not all("=" in line for line in lines[1:]):
+                errors.put(f"fichier env invalide: {lines}")
+        except FileNotFoundError:
+            continue
+        except ValueError as e:
+            errors.put(f"JSON partiel: {e}")
+
+
+def test_concurrent_writers(tmp_path):
+    paths = {
+        "json": str(tmp_path / "state.json"),
+        "env": str(tmp_path / ".env_for_cron"),
+        "sent": str(tmp_path / "sent_ids.json"),
+    }
+    (tmp_path / ".env_for_cron").write_text("\n".join(HEADER) + "\n")
+
+    stop = context.Event()
+    errors = context.Queue()
+    watcher = context.Process(target=reader, args=(paths, stop, errors))
+    watcher.start()
+    writers = [context.Process(target=writer, args=(paths, i)) for i in range(WRITERS)]
+    for process in writers:
+        process.start()
+    for process in writers:
+        process.join(timeout=120)
+    stop.set()
+    watcher.join(timeout=10)
+
+    assert all(process.exitcode == 0 for process in writers)
+    problems = []
+    while not errors.empty():
+        problems.append(errors.get())
+    assert problems == []
+
+    # update_json: aucun incrément perdu, dernière valeur de chaque écrivain
+    data = read_json(paths["json"])
+    assert data["count"] == WRITERS * UPDATES
+    assert all(data[f"w{i}"] == UPDATES - 1 for i in range(WRITERS))
+
+    # update_env_file: lignes existantes conservées, une seule ligne par clé
+    lines = (tmp_path / ".env_for_cron").read_text().splitlines()
+    assert lines[:2] == HEADER
+    assert sum(line.startswith("DAYS_BACK=") for line in lines) == 1
+    assert all(f"KEY_{i}={UPDATES - 1}" in lines for i in range(WRITERS))
+    assert len(lines) == len(HEADER) + 1 + WRITERS
+
+    # JsonSentStore.add_many: tous les IDs de tous les processus
+    assert len(read_json(paths["sent"])) == WRITERS * UPDATES
+    assert JsonSentStore(paths["sent"]).count() == WRITERS * UPDATES
+
+    # Pas de fichier temporaire abandonné
+    assert not [p for p in tmp_path.iterdir() if p.name.startswith(".tmp-")]
@@ -0,0 +1,49 @@
+"""
+Flux SSE de l'interface web: limite commune (logs et sortie des jobs) par processus
+"""
+
+import threading
+
+import pytest
+
+import web_interface as web
+from netflix_jobs import JobQueue
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(web, "_jobs", JobQueue(tmp_path / "jobs.db", tmp_path / "jobs"))
+    monkeypatch.setattr(web, "stream_subscribers", threading.BoundedSemaphore(2))
+    monkeypatch.setattr(web, "MAX_LOG_SUBSCRIBERS", 2)
+    client = web.app.test_client()
+    with client.session_transaction() as session:
+        session["username"] = "admin"
+    return client
+
+
+def test_job_streams_share_the_subscriber_cap(client):
+    job, _ = web.get_jobs().submit("run", requested_by="admin")
+    url = f"/api/jobs/{job['id']}/stream"
+
+    first = client.get(url, buffered=False)
+    second = client.get(url, buffered=False)
+    assert first.status_code == second.status_code == 200
+
+    refused = client.get(url, buffered=False)
+    assert refused.status_code == 503
+    assert client.get("/api/logs/stream", buffered=False).status_code == 503
+
+    # Flux fermé par le client: la place est libérée
+    first.close()
+    third = client.get(url, buffered=False)
+    assert third.status_code == 200
+    second.close()
+    third.close()
+
+
+def test_unknown_job_does_not_take_a_slot(client):
+    assert client.get("/api/jobs/999/stream").status_code == 404
+    streams = [client.get("/api/logs/stream", buffered=False) for _ in range(2)]
+    assert [s.status_code for s in streams] == [200, 200]
+    for stream in streams:
+        stream.close()
@@ -5,16 +5,31 @@ Netflix Bot v3 - Interface Web Flask avec Authentification
 Interface de monitoring et configuration du bot Netflix (API mdblist)
 """
 
-from flask import Flask, render_template, jsonify, request, send_file, session, redirect, url_for
+from flask import Flask, Response, render_template, jsonify, request, send_file, session, redirect, url_for
 from werkzeug.security import generate_password_hash, check_password_hash
 from functools import wraps
+import atexit
+import hashlib
 import os
 import json
 import logging
 import subprocess
+import threading
+import time
 from datetime import datetime, timedelta
 from pathlib import Path
 
+from netflix_http import load_breaker_states
+from netflix_jobs import FINISHED, JobQueue, JobRunner
+from netflix_logs import (
+    SharedRotatingFileHandler, file_identity, find_last_line, follow_file, iter_log_range, tail_lines
+)
+from netflix_metrics import render_prometheus
+from netflix_storage import (
+    QuotaTracker, RunLog, UsersRepository, atomic_write_json, file_lock, file_signature,
+    open_sent_store, state_lock, update_env_file
+)
+
 app = Flask(__name__)
 
 # Configuration de sécurité
@@ -24,11 +39,40 @@ app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(hours=24)
 # Configuration
 DATA_DIR = "/app/data"
 LOGS_DIR = "/app/logs"
-MEMORY_FILE = f"{DATA_DIR}/sent_ids.json"
+LIST_STATE_FILE = f"{DATA_DIR}/list_state.json"
+BLOOM_FILE = f"{DATA_DIR}/sent_ids.bloom"
+RUN_LOCK_FILE = f"{DATA_DIR}/run.lock"
 LOG_FILE = f"{LOGS_DIR}/netflix_bot.log"
 CRON_LOG_FILE = f"{LOGS_DIR}/cron.log"
 ENV_FILE = "/app/.env_for_cron"
 USERS_FILE = f"{DATA_DIR}/users.json"
+LAST_LOGIN_FLUSH_SECONDS = 60  # dernières connexions écrites par lots
+DEDUP_BACKEND = os.environ.get('DEDUP_BACKEND', 'sqlite')
+QUOTA_FILE = f"{DATA_DIR}/quota.db"
+BREAKER_FILE = f"{DATA_DIR}/circuit_breakers.json"
+RUNS_FILE = f"{DATA_DIR}/runs.db"
+METRICS_FILE = f"{DATA_DIR}/metrics.db"
+MAX_LOG_LINES = 5000  # lignes max renvoyées par /api/logs
+# Runs manuels: file de jobs (data/jobs.db), sortie par job dans logs/jobs/
+JOBS_FILE = f"{DATA_DIR}/jobs.db"
+JOBS_OUTPUT_DIR = f"{LOGS_DIR}/jobs"
+JOB_TIMEOUT_SECONDS = int(os.environ.get('JOB_TIMEOUT_SECONDS', '300'))
+# --wait-lock: attend la fin d'un run cron/daemon en cours; 75 = run ignoré (verrou pris)
+BOT_COMMAND = ['python', '/app/netflix_bot.py', '--wait-lock']
+BOT_EXIT_RUN_LOCKED = 75
+# Flux SSE (logs et sortie des jobs): connexions simultanées max (par processus)
+# Chaque flux occupe un thread du worker tant qu'il reste ouvert
+MAX_LOG_SUBSCRIBERS = int(os.environ.get('MAX_LOG_SUBSCRIBERS', '5'))
+stream_subscribers = threading.BoundedSemaphore(MAX_LOG_SUBSCRIBERS)
+# Cache des réponses /api/status et /api/stats (secondes): invalidé plus tôt si un fichier
+# source change; borne la fraîcheur de ce qui n'a pas de fichier (processus cron/daemon)
+DASHBOARD_CACHE_SECONDS = int(os.environ.get('DASHBOARD_CACHE_SECONDS', '60'))
+# Jeton optionnel pour /metrics (Authorization: Bearer <jeton>), vide = accès libre
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+API_LIMITS = {
+    'mdblist': {'daily': int(os.environ.get('MDBLIST_DAILY_BUDGET', '1000'))},
+    'tmdb': {'daily': int(os.environ.get('TMDB_DAILY_BUDGET', '0'))},
+}
 
 # Configurer le logging pour écrire dans le fichier de logs
 os.makedirs(LOGS_DIR, exist_ok=True)
@@ -36,7 +80,7 @@ logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
     handlers=[
-        logging.FileHandler(LOG_FILE),
+        SharedRotatingFileHandler(LOG_FILE),
         logging.StreamHandler()
     ]
 )
@@ -44,7 +88,13 @@ logging.basicConfig(
 # Créer le fichier users.json s'il n'existe pas
 def init_users_file():
     """Initialiser le fichier users avec un compte admin par défaut"""
-    if not os.path.exists(USERS_FILE):
+    if os.path.exists(USERS_FILE):
+        return
+    os.makedirs(DATA_DIR, exist_ok=True)
+    # Plusieurs processus web peuvent démarrer en même temps: un seul crée le fichier
+    with state_lock(USERS_FILE):
+        if os.path.exists(USERS_FILE):
+            return
         default_users = {
             "admin": {
                 "password": generate_password_hash("admin123"),
@@ -52,14 +102,127 @@ def init_users_file():
                 "created_at": datetime.now().isoformat()
             }
         }
-        os.makedirs(DATA_DIR, exist_ok=True)
-        with open(USERS_FILE, 'w') as f:
-            json.dump(default_users, f, indent=2)
-        print("⚠️  Compte admin par défaut créé: admin / admin123")
-        print("⚠️  CHANGEZ LE MOT DE PASSE IMMÉDIATEMENT!")
+        atomic_write_json(USERS_FILE, default_users, indent=2)
+    print("⚠️  Compte admin par défaut créé: admin / admin123")
+    print("⚠️  CHANGEZ LE MOT DE PASSE IMMÉDIATEMENT!")
 
 # Initialiser au démarrage
 init_users_file()
+users_repo = UsersRepository(USERS_FILE, flush_interval=LAST_LOGIN_FLUSH_SECONDS)
+atexit.register(users_repo.flush)
+
+_sent_store = None
+
+def get_sent_store():
+    """Store anti-doublons partagé (ouvert à la première utilisation)"""
+    global _sent_store
+    if _sent_store is None:
+        os.makedirs(DATA_DIR, exist_ok=True)
+        _sent_store = open_sent_store(DEDUP_BACKEND, DATA_DIR)
+    return _sent_store
+
+_quota = None
+
+def get_quota():
+    """Suivi des quotas d'API écrit par le bot (ouvert à la première utilisation)"""
+    global _quota
+    if _quota is None:
+        os.makedirs(DATA_DIR, exist_ok=True)
+        _quota = QuotaTracker(QUOTA_FILE, API_LIMITS)
+    return _quota
+
+_runs = None
+
+def get_runs():
+    """Historique des runs écrit par le bot (ouvert à la première utilisation)"""
+    global _runs
+    if _runs is None:
+        os.makedirs(DATA_DIR, exist_ok=True)
+        _runs = RunLog(RUNS_FILE)
+    return _runs
+
+_jobs = None
+_job_runner = None
+
+def get_jobs():
+    """File des jobs partagée entre processus web (ouverte à la première utilisation)"""
+    global _jobs
+    if _jobs is None:
+        os.makedirs(DATA_DIR, exist_ok=True)
+        _jobs = JobQueue(JOBS_FILE, JOBS_OUTPUT_DIR)
+    return _jobs
+
+def get_job_runner():
+    """Thread d'exécution des jobs de ce processus (démarré à la première utilisation)"""
+    global _job_runner
+    if _job_runner is None:
+        _job_runner = JobRunner(get_jobs(), BOT_COMMAND, JOB_TIMEOUT_SECONDS,
+                                skipped_exit_code=BOT_EXIT_RUN_LOCKED)
+    _job_runner.start()
+    return _job_runner
+
+class ResponseCache:
+    """
+    Réponses JSON du dashboard en mémoire (par processus), avec leur ETag
+    Une entrée reste valide tant que ses fichiers sources ont la même signature
+    (inode/mtime/taille: un stat par fichier, aucune lecture) et au plus ttl secondes
+    """
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries = {}
+
+    def get(self, key, paths, build):
+        """(corps JSON, etag) de l'entrée key, reconstruite par build() si périmée"""
+        signature = tuple(file_signature(path) for path in paths)
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(key)
+        if entry and entry[0] == signature and now < entry[1]:
+            return entry[2], entry[3]
+        body = app.json.dumps(build()).encode('utf-8')
+        etag = hashlib.sha1(body).hexdigest()
+        with self.lock:
+            self.entries[key] = (signature, now + self.ttl, body, etag)
+        return body, etag
+
+response_cache = ResponseCache(DASHBOARD_CACHE_SECONDS)
+
+# Fichiers dont dépendent les réponses du dashboard (SQLite: base et journal WAL)
+SENT_STORE_FILES = [f"{DATA_DIR}/sent_ids.db", f"{DATA_DIR}/sent_ids.db-wal",
+                    f"{DATA_DIR}/sent_ids.json"]
+STATUS_SOURCES = [ENV_FILE, BREAKER_FILE, QUOTA_FILE, f"{QUOTA_FILE}-wal",
+                  RUNS_FILE, f"{RUNS_FILE}-wal"] + SENT_STORE_FILES
+STATS_SOURCES = [RUNS_FILE, f"{RUNS_FILE}-wal"] + SENT_STORE_FILES
+
+def cached_json_response(key, paths, build):
+    """Réponse JSON servie depuis le cache; 304 si le client a déjà cette version (If-None-Match)"""
+    body, etag = response_cache.get(key, paths, build)
+    response = app.response_class(body, mimetype='application/json')
+    response.set_etag(etag)
+    # Le navigateur garde la réponse mais revalide à chaque appel
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response.make_conditional(request)
+
+def format_run_date(timestamp):
+    return datetime.fromtimestamp(timestamp).strftime('%d/%m/%Y %H:%M:%S')
+
+def last_run_from_logs():
+    """Dernière exécution d'après la fin des logs (runs antérieurs à runs.db)"""
+    if not os.path.exists(LOG_FILE):
+        return "Jamais"
+    line = find_last_line(
+        LOG_FILE, lambda l: "✨ Traitement terminé" in l or "🏁 TERMINÉ" in l, max_lines=MAX_LOG_LINES
+    )
+    if line is None:
+        return "Jamais"
+    timestamp_str = line.split(' - ')[0]
+    try:
+        dt = datetime.strptime(timestamp_str.split(',')[0], '%Y-%m-%d %H:%M:%S')
+        return dt.strftime('%d/%m/%Y %H:%M:%S')
+    except ValueError:
+        return timestamp_str
 
 # ============================================================================
 # FONCTIONS D'AUTHENTIFICATION
@@ -79,23 +242,18 @@ def login_required(f):
 
 def get_users():
     """Récupérer tous les utilisateurs"""
-    try:
-        with open(USERS_FILE, 'r') as f:
-            return json.load(f)
-    except:
-        return {}
+    return users_repo.all()
 
-def save_users(users):
-    """Sauvegarder les utilisateurs"""
-    with open(USERS_FILE, 'w') as f:
-        json.dump(users, f, indent=2)
+def save_users(username, **fields):
+    """Mettre à jour les champs d'un utilisateur (relu sous verrou: pas d'écriture perdue)"""
+    users_repo.update(username, **fields)
 
 def verify_user(username, password):
-    """Vérifier les credentials d'un utilisateur"""
-    users = get_users()
-    if username in users:
-        return check_password_hash(users[username]['password'], password)
-    return False
+    """Vérifier les credentials d'un utilisateur: le compte, ou None"""
+    user = users_repo.get(username)
+    if user and check_password_hash(user['password'], password):
+        return user
+    return None
 
 # ============================================================================
 # ROUTES D'AUTHENTIFICATION
@@ -109,16 +267,15 @@ def login():
         password = request.form.get('password')
         remember = request.form.get('remember') == 'on'
         
-        if verify_user(username, password):
+        user = verify_user(username, password)
+        if user:
             session['username'] = username
-            session['role'] = get_users()[username].get('role', 'user')
+            session['role'] = user.get('role', 'user')
             if remember:
                 session.permanent = True
             
-            # Log de connexion
-            users = get_users()
-            users[username]['last_login'] = datetime.now().isoformat()
-            save_users(users)
+            # Log de connexion (écrit par lots)
+            users_repo.record_login(username, datetime.now().isoformat())
             
             return redirect(url_for('index'))
         else:
@@ -145,16 +302,16 @@ def change_password():
         new_password = request.json.get('new_password')
         username = session.get('username')
         
-        users = get_users()
-        
         # Vérifier le mot de passe actuel
-        if not check_password_hash(users[username]['password'], current_password):
+        if not verify_user(username, current_password):
             return jsonify({'success': False, 'error': 'Mot de passe actuel incorrect'}), 401
         
         # Mettre à jour le mot de passe
-        users[username]['password'] = generate_password_hash(new_password)
-        users[username]['password_changed_at'] = datetime.now().isoformat()
-        save_users(users)
+        save_users(
+            username,
+            password=generate_password_hash(new_password),
+            password_changed_at=datetime.now().isoformat()
+        )
         
         return jsonify({'success': True, 'message': 'Mot de passe changé avec succès'})
     except Exception as e:
@@ -180,152 +337,178 @@ def health():
         'version': '3.0'
     }), 200
 
+@app.route('/metrics')
+def metrics():
+    """Métriques Prometheus (public comme /health, ou protégé par METRICS_TOKEN)"""
+    if METRICS_TOKEN and request.headers.get('Authorization') != f'Bearer {METRICS_TOKEN}':
+        return Response('Unauthorized\n', status=401, mimetype='text/plain')
+    
+    # Jauges lues à la demande: circuits ouverts, quotas consommés, IDs envoyés
+    states = {'closed': 0, 'half_open': 0.5, 'open': 1}
+    gauges = {
+        'netflix_circuit_open': (
+            "État des circuit breakers (0 fermé, 0.5 semi-ouvert, 1 ouvert)",
+            [({'upstream': name}, states.get(b.get('state'), 0))
+             for name, b in load_breaker_states(BREAKER_FILE).items()]
+        ),
+    }
+    try:
+        gauges['netflix_quota_used'] = (
+            "Requêtes d'API consommées aujourd'hui",
+            [({'provider': name}, q['used']) for name, q in get_quota().snapshot().items()]
+        )
+        gauges['netflix_sent_ids'] = ("IDs déjà notifiés", [({}, get_sent_store().count())])
+    except Exception as e:
+        logging.getLogger(__name__).error(f"Erreur jauges /metrics: {e}")
+    
+    os.makedirs(DATA_DIR, exist_ok=True)
+    return Response(render_prometheus(METRICS_FILE, gauges),
+                    content_type='text/plain; version=0.0.4; charset=utf-8')
+
 @app.route('/api/status')
 @login_required
 def get_status():
-    """API: Récupérer le statut du bot v3"""
+    """API: Récupérer le statut du bot v3 (mis en cache, voir ResponseCache)"""
     try:
-        # Vérifier si cron tourne (support cron et crond)
-        try:
-            # Essayer avec pgrep (cherche cron OU crond)
-            result = subprocess.run(['pgrep', '-f', 'cron'], capture_output=True, timeout=5)
-            cron_running = result.returncode == 0
-        except:
-            # Fallback : vérifier les fichiers PID
-            cron_running = os.path.exists('/var/run/crond.pid') or os.path.exists('/var/run/cron.pid')
-        
-        # Récupérer les variables d'environnement v3
-        env_vars = {}
-        if os.path.exists(ENV_FILE):
-            with open(ENV_FILE, 'r') as f:
-                for line in f:
-                    if '=' in line:
-                        key, value = line.strip().split('=', 1)
-                        if 'KEY' in key or 'WEBHOOK' in key:
-                            env_vars[key] = value[:10] + '***' if len(value) > 10 else '***'
-                        else:
-                            env_vars[key] = value
-        
-        # Récupérer les statistiques
-        sent_count = 0
-        if os.path.exists(MEMORY_FILE):
-            try:
-                with open(MEMORY_FILE, 'r') as f:
-                    sent_ids = json.load(f)
-                    if isinstance(sent_ids, (dict, list)):
-                        sent_count = len(sent_ids)
-            except:
-                sent_count = 0
-        
-        # Dernière exécution depuis les logs
-        last_run = "Jamais"
-        if os.path.exists(LOG_FILE):
-            with open(LOG_FILE, 'r') as f:
-                lines = f.readlines()
-                for line in reversed(lines):
-                    if "✨ Traitement terminé" in line or "🏁 TERMINÉ" in line:
-                        try:
-                            timestamp_str = line.split(' - ')[0]
-                            dt = datetime.strptime(timestamp_str.split(',')[0], '%Y-%m-%d %H:%M:%S')
-                            last_run = dt.strftime('%d/%m/%Y %H:%M:%S')
-                        except:
-                            last_run = timestamp_str
-                        break
-        
-        return jsonify({
-            'status': 'running' if cron_running else 'stopped',
-            'cron_active': cron_running,
-            'version': '3.0',
-            'api_source': 'mdblist.com',
-            'environment': env_vars,
-            'statistics': {
-                'total_sent': sent_count,
-                'last_run': last_run
-            }
-        })
+        return cached_json_response('status', STATUS_SOURCES, build_status)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def build_status():
+    """Statut complet (pgrep, .env_for_cron, store, quotas, circuits, dernier run)"""
+    # Vérifier si cron tourne (support cron et crond)
+    try:
+        # Essayer avec pgrep (cherche cron OU crond)
+        result = subprocess.run(['pgrep', '-f', 'cron'], capture_output=True, timeout=5)
+        cron_running = result.returncode == 0
+    except:
+        # Fallback : vérifier les fichiers PID
+        cron_running = os.path.exists('/var/run/crond.pid') or os.path.exists('/var/run/cron.pid')
+    
+    # Mode daemon (BOT_MODE=daemon) : planification interne au bot
+    try:
+        result = subprocess.run(['pgrep', '-f', 'netflix_bot.py --daemon'], capture_output=True, timeout=5)
+        daemon_running = result.returncode == 0
+    except:
+        daemon_running = False
+    
+    # Récupérer les variables d'environnement v3
+    env_vars = {}
+    if os.path.exists(ENV_FILE):
+        with open(ENV_FILE, 'r') as f:
+            for line in f:
+                if '=' in line:
+                    key, value = line.strip().split('=', 1)
+                    if 'KEY' in key or 'WEBHOOK' in key:
+                        env_vars[key] = value[:10] + '***' if len(value) > 10 else '***'
+                    else:
+                        env_vars[key] = value
+    
+    # Récupérer les statistiques
+    try:
+        sent_count = get_sent_store().count()
+    except:
+        sent_count = 0
+    
+    # Quotas d'API du jour
+    try:
+        quota = get_quota().snapshot()
+    except:
+        quota = {}
+    
+    # État des circuit breakers mdblist/TMDB (écrit par le bot à chaque transition)
+    breakers = load_breaker_states(BREAKER_FILE)
+    
+    # Dernière exécution depuis l'historique des runs
+    try:
+        latest_run = get_runs().latest()
+    except:
+        latest_run = None
+    last_run = format_run_date(latest_run['finished_at']) if latest_run else last_run_from_logs()
+    
+    return {
+        'status': 'running' if cron_running or daemon_running else 'stopped',
+        'cron_active': cron_running or daemon_running,
+        'daemon_active': daemon_running,
+        'version': '3.0',
+        'api_source': 'mdblist.com',
+        'environment': env_vars,
+        'statistics': {
+            'total_sent': sent_count,
+            'last_run': last_run,
+            'last_run_status': latest_run['status'] if latest_run else None
+        },
+        'quota': quota,
+        'circuit_breakers': breakers
+    }
+
 @app.route('/api/stats')
 @login_required
 def get_stats():
-    """API: Récupérer les statistiques détaillées v3"""
+    """API: Récupérer les statistiques détaillées v3 (mis en cache, voir ResponseCache)"""
     try:
-        stats = {
-            'total_content': 0,
-            'recent_notifications': [],
-            'last_run': {
-                'movies_found': 0,
-                'shows_found': 0,
-                'new_sent': 0,
-                'date': 'N/A'
-            }
-        }
-        
-        # Lire les IDs envoyés
-        if os.path.exists(MEMORY_FILE):
-            try:
-                with open(MEMORY_FILE, 'r') as f:
-                    sent_ids = json.load(f)
-                    # Gérer dict ou list
-                    if isinstance(sent_ids, dict):
-                        stats['total_content'] = len(sent_ids)
-                    elif isinstance(sent_ids, list):
-                        stats['total_content'] = len(sent_ids)
-                    else:
-                        stats['total_content'] = 0
-            except:
-                stats['total_content'] = 0
-        
-        # Analyser les logs du dernier run
-        if os.path.exists(LOG_FILE):
-            with open(LOG_FILE, 'r', encoding='utf-8', errors='ignore') as f:
-                lines = f.readlines()
-            
-            # Parser le dernier run
-            for line in reversed(lines[-200:]):
-                if "✅ Trouvé" in line and "movies" in line:
-                    try:
-                        count = int(line.split("✅ Trouvé")[1].split("movies")[0].strip())
-                        stats['last_run']['movies_found'] = count
-                    except:
-                        pass
-                
-                if "✅ Trouvé" in line and "shows" in line:
-                    try:
-                        count = int(line.split("✅ Trouvé")[1].split("shows")[0].strip())
-                        stats['last_run']['shows_found'] = count
-                    except:
-                        pass
-                
-                if "✅" in line and "notifications envoyées" in line:
-                    try:
-                        count = int(line.split("✅")[1].split("notifications")[0].strip())
-                        stats['last_run']['new_sent'] = count
-                    except:
-                        pass
-                
-                if "✨ Traitement terminé" in line:
-                    try:
-                        timestamp_str = line.split(' - ')[0]
-                        dt = datetime.strptime(timestamp_str.split(',')[0], '%Y-%m-%d %H:%M:%S')
-                        stats['last_run']['date'] = dt.strftime('%d/%m/%Y %H:%M:%S')
-                    except:
-                        stats['last_run']['date'] = timestamp_str
-                    break
-        
-        return jsonify(stats)
+        return cached_json_response('stats', STATS_SOURCES, build_stats)
     except Exception as e:
         import traceback
         return jsonify({'error': str(e), 'traceback': traceback.format_exc()}), 500
 
+def build_stats():
+    """Statistiques du store et du dernier run"""
+    stats = {
+        'total_content': 0,
+        'recent_notifications': [],
+        'last_run': {
+            'movies_found': 0,
+            'shows_found': 0,
+            'new_sent': 0,
+            'date': 'N/A'
+        }
+    }
+    
+    # Compter les IDs envoyés
+    try:
+        stats['total_content'] = get_sent_store().count()
+    except:
+        stats['total_content'] = 0
+    
+    # Dernier run (enregistrement structuré écrit par le bot)
+    try:
+        latest_run = get_runs().latest()
+    except:
+        latest_run = None
+    if latest_run:
+        counts = latest_run.get('counts', {})
+        stats['last_run'] = {
+            'movies_found': counts.get('movies_found', 0),
+            'shows_found': counts.get('shows_found', 0),
+            'new_sent': counts.get('new_sent', 0),
+            'date': format_run_date(latest_run['finished_at']),
+            'status': latest_run['status'],
+            'duration': latest_run['duration'],
+            'phases': latest_run.get('phases', {}),
+            'api_calls': latest_run.get('api_calls', {}),
+            'warnings': latest_run.get('warnings', 0),
+            'errors': latest_run.get('errors', []),
+        }
+    
+    return stats
+
+@app.route('/api/quota')
+@login_required
+def get_quota_status():
+    """API: Quotas d'API restants aujourd'hui (mdblist, TMDB)"""
+    try:
+        return jsonify(get_quota().snapshot())
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/logs')
 @login_required
 def get_logs():
     """API: Récupérer les logs"""
     try:
         log_type = request.args.get('type', 'debug')
-        lines = int(request.args.get('lines', 100))
+        lines = max(1, min(int(request.args.get('lines', 100)), MAX_LOG_LINES))
         
         if log_type == 'cron':
             log_file = CRON_LOG_FILE
@@ -335,36 +518,163 @@ def get_logs():
         if not os.path.exists(log_file):
             return jsonify({'logs': 'Aucun log disponible'})
         
-        with open(log_file, 'r', encoding='utf-8', errors='ignore') as f:
-            all_lines = f.readlines()
-            last_lines = all_lines[-lines:] if len(all_lines) > lines else all_lines
-            
-        return jsonify({'logs': ''.join(last_lines)})
+        # Lecture à rebours depuis la fin: coût proportionnel à lines, pas à la taille du fichier
+        last_lines = tail_lines(log_file, lines)
+        return jsonify({'logs': ''.join(line + '\n' for line in last_lines)})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/logs/stream')
+@login_required
+def stream_logs():
+    """
+    API: Logs en direct (Server-Sent Events)
+    ?lines=N: dernières lignes envoyées avant le suivi
+    Reprise via Last-Event-ID (ou ?from=) "inode:offset": seules les lignes suivantes sont envoyées
+    """
+    log_file = CRON_LOG_FILE if request.args.get('type') == 'cron' else LOG_FILE
+    if not os.path.exists(log_file):
+        open(log_file, 'a').close()
+    
+    inode, offset = None, None
+    resume = request.headers.get('Last-Event-ID') or request.args.get('from')
+    if resume:
+        try:
+            inode_str, _, offset_str = resume.partition(':')
+            inode, offset = int(inode_str), int(offset_str)
+        except ValueError:
+            return jsonify({'error': 'Last-Event-ID invalide'}), 400
+    
+    if not stream_subscribers.acquire(blocking=False):
+        return jsonify({'error': f'Trop de flux en direct ouverts (max {MAX_LOG_SUBSCRIBERS})'}), 503
+    
+    backlog = []
+    if offset is None:
+        # Historique jusqu'à un offset fixé, puis suivi à partir de ce même offset
+        try:
+            inode = file_identity(log_file)
+            offset = os.path.getsize(log_file)
+            lines = max(0, min(int(request.args.get('lines', 0)), MAX_LOG_LINES))
+            backlog = tail_lines(log_file, lines, end=offset)
+        except Exception as e:
+            stream_subscribers.release()
+            return jsonify({'error': str(e)}), 500
+    
+    def generate():
+        yield 'retry: 3000\n\n'
+        for line in backlog:
+            yield f'data: {line}\n\n'
+        # Position de reprise même sans nouvelle ligne (id sans data: pas d'événement côté client)
+        yield f'id: {inode}:{offset}\n\n'
+        for kind, file_inode, position, line in follow_file(log_file, inode, offset):
+            if kind == 'line':
+                yield f'id: {file_inode}:{position}\ndata: {line}\n\n'
+            elif kind == 'rotated':
+                yield f'id: {file_inode}:0\nevent: rotated\ndata: \n\n'
+            else:
+                # Le heartbeat détecte les clients déconnectés (libère la place)
+                yield ': heartbeat\n\n'
+    
+    response = Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
+    })
+    response.call_on_close(stream_subscribers.release)
+    return response
+
 @app.route('/api/run', methods=['POST'])
 @login_required
 def run_bot():
-    """API: Exécuter le bot manuellement"""
+    """
+    API: Lancer le bot manuellement (en arrière-plan)
+    Retourne immédiatement l'ID du job; une demande pendant qu'un job attend rejoint ce job
+    """
     try:
-        result = subprocess.run(
-            ['python', '/app/netflix_bot.py'],
-            capture_output=True,
-            text=True,
-            timeout=300
-        )
-        
+        job, created = get_jobs().submit('run', requested_by=session.get('username'))
+        get_job_runner().notify()
         return jsonify({
-            'success': result.returncode == 0,
-            'output': result.stdout,
-            'error': result.stderr
-        })
-    except subprocess.TimeoutExpired:
-        return jsonify({'success': False, 'error': 'Timeout (>5min)'}), 500
+            'success': True,
+            'job_id': job['id'],
+            'status': job['status'],
+            'created': created
+        }), 202
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.route('/api/jobs')
+@login_required
+def list_jobs():
+    """API: Derniers jobs"""
+    try:
+        get_job_runner()
+        return jsonify({'jobs': get_jobs().recent()})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/jobs/<int:job_id>')
+@login_required
+def get_job(job_id):
+    """API: État d'un job et sortie à partir de ?offset= (suivi incrémental)"""
+    try:
+        job = get_jobs().get(job_id)
+        if job is None:
+            return jsonify({'error': 'Job introuvable'}), 404
+        offset = max(0, int(request.args.get('offset', 0)))
+        output, next_offset = get_jobs().read_output(job_id, offset)
+        job.update({'output': output, 'next_offset': next_offset, 'finished': job['status'] in FINISHED})
+        return jsonify(job)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/jobs/<int:job_id>/stream')
+@login_required
+def stream_job(job_id):
+    """API: Sortie d'un job en direct (Server-Sent Events), événement "done" à la fin"""
+    jobs = get_jobs()
+    if jobs.get(job_id) is None:
+        return jsonify({'error': 'Job introuvable'}), 404
+    try:
+        offset = int(request.headers.get('Last-Event-ID') or request.args.get('offset', 0))
+    except ValueError:
+        offset = 0
+    
+    # Même limite que le flux de logs: un job long ne doit pas accaparer les threads du worker
+    if not stream_subscribers.acquire(blocking=False):
+        return jsonify({'error': f'Trop de flux en direct ouverts (max {MAX_LOG_SUBSCRIBERS})'}), 503
+    
+    def generate():
+        # Premier octet immédiat: en-têtes envoyés même si le job n'a encore rien écrit
+        yield 'retry: 3000\n\n'
+        position = offset
+        idle = 0.0
+        while True:
+            # État lu avant la sortie: rien ne peut être écrit après un job terminé
+            job = jobs.get(job_id)
+            finished = job is None or job['status'] in FINISHED
+            output, next_position = jobs.read_output(job_id, position, complete_lines=not finished)
+            for line in output.splitlines():
+                yield f'data: {line}\n\n'
+            if next_position != position:
+                position = next_position
+                idle = 0.0
+                yield f'id: {position}\n\n'
+                continue
+            if finished:
+                yield f'event: done\ndata: {json.dumps(job)}\n\n'
+                return
+            time.sleep(1)
+            idle += 1
+            if idle >= 15:
+                idle = 0.0
+                yield ': heartbeat\n\n'
+    
+    response = Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
+    })
+    response.call_on_close(stream_subscribers.release)
+    return response
+
 @app.route('/api/config', methods=['GET', 'POST'])
 @login_required
 def config():
@@ -425,24 +735,8 @@ def config_days_back():
             except:
                 return jsonify({'success': False, 'error': 'Valeur invalide'}), 400
             
-            # Lire et mettre à jour
-            env_lines = []
-            if os.path.exists(ENV_FILE):
-                with open(ENV_FILE, 'r') as f:
-                    env_lines = f.readlines()
-            
-            updated = False
-            for i, line in enumerate(env_lines):
-                if line.startswith('DAYS_BACK='):
-                    env_lines[i] = f'DAYS_BACK={days_int}\n'
-                    updated = True
-                    break
-            
-            if not updated:
-                env_lines.append(f'DAYS_BACK={days_int}\n')
-            
-            with open(ENV_FILE, 'w') as f:
-                f.writelines(env_lines)
+            # Lire et mettre à jour (sous verrou, remplacement atomique du fichier)
+            update_env_file(ENV_FILE, {'DAYS_BACK': days_int})
             
             return jsonify({'success': True, 'days_back': days_int})
         except Exception as e:
@@ -456,38 +750,41 @@ def reset_memory():
     logger = logging.getLogger(__name__)
     
     try:
-        # Compter combien d'IDs avant suppression
-        ids_before = 0
-        titles_deleted = []
+        # Pas de reset pendant un run: le bot réécrirait l'état qu'on vient d'effacer
+        with file_lock(RUN_LOCK_FILE, blocking=False) as acquired:
+            if not acquired:
+                return jsonify({
+                    'success': False,
+                    'error': 'Un run est en cours, réessayez dans quelques instants'
+                }), 409
+            store = get_sent_store()
         
-        if os.path.exists(MEMORY_FILE):
-            try:
-                with open(MEMORY_FILE, 'r') as f:
-                    old_data = json.load(f)
-                    if isinstance(old_data, dict):
-                        ids_before = len(old_data)
-                        # Récupérer tous les titres
-                        titles_deleted = [v.get('title', 'Inconnu') for k, v in old_data.items() if isinstance(v, dict)]
-            except:
-                pass
+            # Compter combien d'IDs avant suppression
+            ids_before = store.count()
+            titles_deleted = store.titles(limit=20)
         
-        # Logger dans le fichier de logs
-        logger.info("=" * 60)
-        logger.info("🔄 RÉINITIALISATION DE LA MÉMOIRE")
-        logger.info("=" * 60)
-        logger.info(f"👤 Utilisateur: {session.get('username', 'inconnu')}")
-        logger.info(f"📊 IDs en mémoire: {ids_before}")
+            # Logger dans le fichier de logs
+            logger.info("=" * 60)
+            logger.info("🔄 RÉINITIALISATION DE LA MÉMOIRE")
+            logger.info("=" * 60)
+            logger.info(f"👤 Utilisateur: {session.get('username', 'inconnu')}")
+            logger.info(f"📊 IDs en mémoire: {ids_before}")
+        
+            if titles_deleted:
+                logger.info(f"🎬 Titres supprimés ({ids_before}):")
+                for title in titles_deleted:  # Limité à 20
+                    logger.info(f"   • {title}")
+                if ids_before > 20:
+                    logger.info(f"   ... et {ids_before - 20} autres")
         
-        if titles_deleted:
-            logger.info(f"🎬 Titres supprimés ({len(titles_deleted)}):")
-            for title in titles_deleted[:20]:  # Limiter à 20
-                logger.info(f"   • {title}")
-            if len(titles_deleted) > 20:
-                logger.info(f"   ... et {len(titles_deleted) - 20} autres")
+            # Réinitialiser
+            store.clear()
         
-        # Réinitialiser
-        with open(MEMORY_FILE, 'w') as f:
-            json.dump({}, f)
+            # Oublier les snapshots des listes pour que tout soit réexaminé
+            for path in (LIST_STATE_FILE, BLOOM_FILE):
+                with state_lock(path):
+                    if os.path.exists(path):
+                        os.remove(path)
         
         logger.info("✅ Mémoire réinitialisée avec succès")
         logger.info("💡 Ces notifications seront renvoyées lors de la prochaine exécution")
@@ -588,14 +885,36 @@ def config_cron():
 @app.route('/download/logs/<log_type>')
 @login_required
 def download_logs(log_type):
-    """Télécharger les logs"""
+    """
+    Télécharger les logs
+    ?since=...&until=... (ISO 8601): plage horaire lue en flux à travers les archives .gz
+    """
     try:
         if log_type == 'debug':
-            return send_file(LOG_FILE, as_attachment=True, download_name='netflix_bot_v3.log')
+            log_file, download_name = LOG_FILE, 'netflix_bot_v3.log'
         elif log_type == 'cron':
-            return send_file(CRON_LOG_FILE, as_attachment=True, download_name='cron.log')
+            log_file, download_name = CRON_LOG_FILE, 'cron.log'
         else:
             return "Type de log inconnu", 404
+        
+        since = request.args.get('since')
+        until = request.args.get('until')
+        if not since and not until:
+            return send_file(log_file, as_attachment=True, download_name=download_name)
+        
+        try:
+            lines = iter_log_range(log_file, since, until)
+            first = next(lines, '')
+        except ValueError:
+            return "Plage invalide (format attendu: 2026-01-31T08:00:00)", 400
+        
+        def generate():
+            yield first
+            yield from lines
+        
+        return Response(generate(), mimetype='text/plain', headers={
+            'Content-Disposition': f'attachment; filename={download_name}'
+        })
     except Exception as e:
         return str(e), 500
 
@@ -624,4 +943,5 @@ if __name__ == '__main__':
     print("📡 API: mdblist.com (gratuite)")
     print("⚠️  CHANGEZ LE MOT DE PASSE!")
     print("=" * 60)
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    # Serveur de développement: en production, gunicorn (voir gunicorn.conf.py)
+    app.run(host='0.0.0.0', port=5000, debug=os.environ.get('FLASK_DEBUG') == '1', threaded=True)